@@ -0,0 +1,218 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.urls import URLPattern
+from rest_framework.exceptions import NotFound
+
+from recipes.models import Favorite, Follow, ShoppingCart
+
+from .db_json import is_database_json_enabled
+from .orm_pool import call_with_wrappers, run_in_pool
+from .serializers import RecipeGetSerializer, get_requested_fields
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def render(response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def call_view(view, request, *args, **kwargs):
+    """Вызывает синхронное представление и сразу рендерит ответ."""
+    return render(view(request, *args, **kwargs))
+
+
+def async_read_view(view):
+    """Асинхронная обертка представления DRF.
+
+    Чтения выполняются в пуле потоков ORM и не занимают общий поток
+    синхронного кода ASGI; остальные запросы обрабатываются как обычно.
+    """
+    async def async_view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await run_in_pool(
+                call_view,
+                view,
+                request,
+                *args,
+                **kwargs
+            )
+        return await sync_to_async(call_with_wrappers)(
+            view,
+            request,
+            *args,
+            **kwargs
+        )
+
+    return wraps(view)(async_view)
+
+
+def get_user_relations(user, fields):
+    """id рецептов в избранном и списке покупок и id авторов подписок."""
+    relations = {}
+    if 'is_favorited' in fields:
+        relations['favorites'] = set(
+            Favorite.objects.filter(user=user).values_list(
+                'recipe_id',
+                flat=True
+            )
+        )
+    if 'is_in_shopping_cart' in fields:
+        relations['shopping_cart'] = set(
+            ShoppingCart.objects.filter(user=user).values_list(
+                'recipe_id',
+                flat=True
+            )
+        )
+    if 'author' in fields:
+        relations['subscriptions'] = set(
+            Follow.objects.filter(user=user).values_list(
+                'author_id',
+                flat=True
+            )
+        )
+    return relations
+
+
+class AsyncRecipeList:
+    """Асинхронный список рецептов.
+
+    Страница рецептов, количество рецептов и связи пользователя с
+    рецептами и авторами загружаются одновременно в пуле потоков ORM.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.sync_view = async_read_view(view)
+        wraps(view)(self)
+        self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def get_viewset(self, request, *args, **kwargs):
+        viewset = self.view.cls(**self.view.initkwargs)
+        viewset.action_map = self.view.actions
+        viewset.args = args
+        viewset.kwargs = kwargs
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        return viewset
+
+    @staticmethod
+    def prepare(viewset):
+        """Проверки доступа, фильтры и размер страницы."""
+        request = viewset.request
+        viewset.initial(request, *viewset.args, **viewset.kwargs)
+        paginator = viewset.paginator
+        page_size = paginator.get_page_size(request)
+        paginator.count_user_id = paginator.get_count_user_id(
+            request,
+            viewset
+        )
+        django_paginator = paginator.django_paginator_class(
+            viewset.filter_queryset(viewset.get_base_queryset()),
+            page_size
+        )
+        number = request.query_params.get(paginator.page_query_param, 1)
+        if number in paginator.last_page_strings:
+            number = django_paginator.num_pages
+        try:
+            offset = max(int(number) - 1, 0) * page_size
+        except ValueError:
+            offset = 0
+        return django_paginator, number, offset
+
+    async def list(self, viewset):
+        request = viewset.request
+        django_paginator, number, offset = await run_in_pool(
+            self.prepare,
+            viewset
+        )
+        queryset = django_paginator.object_list
+        fields = get_requested_fields(
+            request,
+            RecipeGetSerializer.Meta.fields
+        )
+        page_size = django_paginator.per_page
+        loads = [
+            run_in_pool(lambda: django_paginator.count),
+            run_in_pool(lambda: list(queryset[offset:offset + page_size])),
+        ]
+        if request.user.is_authenticated:
+            loads.append(
+                run_in_pool(get_user_relations, request.user, fields)
+            )
+        _, recipes, *relations = await asyncio.gather(*loads)
+        return await run_in_pool(
+            self.get_response,
+            viewset,
+            django_paginator,
+            number,
+            recipes,
+            relations[0] if relations else {}
+        )
+
+    @staticmethod
+    def get_response(viewset, django_paginator, number, recipes, relations):
+        paginator = viewset.paginator
+        try:
+            page = django_paginator.page(number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(
+                page_number=number,
+                message=str(exc)
+            ))
+        page.object_list = recipes
+        paginator.page = page
+        paginator.request = viewset.request
+        context = viewset.get_serializer_context()
+        if 'subscriptions' in relations:
+            context['subscribed_authors'] = relations['subscriptions']
+        for recipe in recipes:
+            if 'favorites' in relations:
+                recipe.is_favorited = recipe.pk in relations['favorites']
+            if 'shopping_cart' in relations:
+                recipe.is_in_shopping_cart = (
+                    recipe.pk in relations['shopping_cart']
+                )
+        serializer = viewset.get_serializer_class()(
+            recipes,
+            many=True,
+            context=context
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def finalize(viewset, response):
+        viewset.response = viewset.finalize_response(
+            viewset.request,
+            response
+        )
+        return render(viewset.response)
+
+    async def __call__(self, request, *args, **kwargs):
+        if request.method != 'GET' or is_database_json_enabled():
+            return await self.sync_view(request, *args, **kwargs)
+        viewset = self.get_viewset(request, *args, **kwargs)
+        try:
+            response = await self.list(viewset)
+        except Exception as exc:
+            response = await run_in_pool(viewset.handle_exception, exc)
+        return await run_in_pool(self.finalize, viewset, response)
+
+
+def get_async_urls(urls):
+    """Маршруты роутера с асинхронными представлениями для ASGI."""
+    return [
+        URLPattern(
+            url.pattern,
+            AsyncRecipeList(url.callback)
+            if url.name == 'recipes-list'
+            else async_read_view(url.callback),
+            url.default_args,
+            url.name
+        )
+        for url in urls
+    ]
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import Ingredient, IngredientChange, Recipe
+
+RECIPE_CACHE_KEY = 'recipe:v2:{}'
+INGREDIENT_SNAPSHOT_CACHE_KEY = 'ingredients:snapshot:v1:{}'
+COUNT_GENERATION_KEY = 'count:generation'
+USER_COUNT_GENERATION_KEY = 'count:generation:user:{}'
+COUNT_CACHE_KEY = 'count:v2:{}:{}'
+
+
+def get_recipe_cache_key(pk):
+    return RECIPE_CACHE_KEY.format(pk)
+
+
+def invalidate_recipe_cache(*pks):
+    """Удаляет из кэша представления рецептов с указанными id.
+
+    Удаление выполняется после фиксации текущей транзакции: иначе
+    запрос, прочитавший рецепт до фиксации, снова сохранил бы в кэш
+    старое представление.
+    """
+    if pks:
+        keys = [get_recipe_cache_key(pk) for pk in pks]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_cached_recipe_data(recipes, serializer_class):
+    """Возвращает не зависящие от пользователя представления рецептов.
+
+    Представления читаются из кэша одним запросом; отсутствующие
+    строятся по заново загруженным рецептам и сохраняются в кэш.
+    """
+    keys = {recipe.pk: get_recipe_cache_key(recipe.pk) for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        missing_recipes = Recipe.objects.filter(
+            pk__in=missing
+        ).select_related('author').prefetch_related('tags')
+        built = {
+            keys[recipe.pk]: serializer_class(recipe).data
+            for recipe in missing_recipes
+        }
+        cache.set_many(built, settings.RECIPE_CACHE_TIMEOUT)
+        cached.update(built)
+    return [cached.get(keys[recipe.pk]) for recipe in recipes]
+
+
+def get_ingredient_version():
+    """Версия каталога ингредиентов - id последнего изменения.
+
+    id изменений выдаются до фиксации транзакций, поэтому изменения моложе
+    INGREDIENT_CHANGES_DELAY в версию не входят: более ранние изменения
+    могут быть еще не зафиксированы.
+    """
+    changes = IngredientChange.objects.all()
+    first_recent_id = IngredientChange.objects.filter(
+        changed_at__gt=timezone.now() - timedelta(
+            seconds=settings.INGREDIENT_CHANGES_DELAY
+        )
+    ).order_by('id').values_list('id', flat=True).first()
+    if first_recent_id is not None:
+        changes = changes.filter(id__lt=first_recent_id)
+    return changes.aggregate(version=Max('id'))['version'] or 0
+
+
+def get_ingredient_snapshot(version, serializer_class, renderer_class):
+    """Возвращает тело снимка каталога ингредиентов и его сжатую копию.
+
+    Снимок строится один раз для каждой версии каталога.
+    """
+    key = INGREDIENT_SNAPSHOT_CACHE_KEY.format(version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        body = renderer_class().render({
+            'version': version,
+            'ingredients': serializer_class(
+                Ingredient.objects.all(),
+                many=True
+            ).data
+        })
+        snapshot = (body, gzip.compress(body, mtime=0))
+        cache.set(key, snapshot, None)
+    return snapshot
+
+
+def invalidate_count_cache(user_id=None):
+    """Делает недействительными сохраненные количества объектов.
+
+    С user_id - только количества, зависящие от отметок пользователя
+    (избранное, список покупок, подписки); без него - все.
+    """
+    key = COUNT_GENERATION_KEY
+    if user_id is not None:
+        key = USER_COUNT_GENERATION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_count_cache_key(queryset, user_id=None):
+    """Ключ количества объектов выборки.
+
+    Для выборок, зависящих от отметок пользователя user_id, ключ
+    включает и поколение его количеств.
+    """
+    sql, params = queryset.query.sql_with_params()
+    signature = hashlib.sha1(f'{sql}{params!r}'.encode()).hexdigest()
+    generation = str(cache.get(COUNT_GENERATION_KEY, 0))
+    if user_id is not None:
+        generation += ':' + str(cache.get(
+            USER_COUNT_GENERATION_KEY.format(user_id),
+            0
+        ))
+    return COUNT_CACHE_KEY.format(generation, signature)
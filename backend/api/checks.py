@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = (DummyCache, LocMemCache)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Буферы замеров должны храниться в общем для процессов кэше.
+
+    Команды slow_queries и memory_profiles выполняются в отдельном
+    процессе и не видят локальный кэш процессов веб-сервера.
+    """
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(cache, PROCESS_LOCAL_CACHES):
+        return []
+    errors = []
+    for error_id, setting, enabled, command in (
+        (
+            'api.E001',
+            'SLOW_QUERY_LOG_ENABLED',
+            settings.SLOW_QUERY_LOG_ENABLED,
+            'slow_queries',
+        ),
+        (
+            'api.E002',
+            'MEMORY_PROFILING_SAMPLE_RATE',
+            settings.MEMORY_PROFILING_SAMPLE_RATE > 0,
+            'memory_profiles',
+        ),
+    ):
+        if enabled:
+            errors.append(Error(
+                f'{setting} включен, но кэш {type(cache).__name__} не общий '
+                f'для процессов: команда {command} не увидит замеры.',
+                hint='Задайте CACHE_BACKEND и CACHE_LOCATION общего кэша '
+                     '(например, memcached).',
+                id=error_id
+            ))
+    return errors
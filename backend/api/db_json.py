@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Aggregate, BooleanField, Case, CharField, Exists,
+                              F, JSONField, OuterRef, Subquery, TextField,
+                              Value, When)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, Concat, JSONObject
+
+from recipes.models import Favorite, Follow, Recipe, ShoppingCart
+
+# jsonb не сохраняет порядок ключей, поэтому объекты ингредиентов
+# пересобираются в json в порядке ключей сериализатора
+INGREDIENTS_JSON_SQL = (
+    'SELECT COALESCE(JSON_AGG(JSON_BUILD_OBJECT('
+    "'id', item -> 'id', "
+    "'name', item -> 'name', "
+    "'measurement_unit', item -> 'measurement_unit', "
+    "'amount', item -> 'amount'"
+    ") ORDER BY position), '[]'::json) "
+    'FROM JSONB_ARRAY_ELEMENTS({table}."ingredients_data") '
+    'WITH ORDINALITY AS items(item, position)'
+)
+# имя файла в URL, экранированное как в FieldFile.url (filepath_to_uri):
+# символы вне безопасного набора заменяются на %XX байтов UTF-8
+IMAGE_PATH_SQL = (
+    "SELECT STRING_AGG(CASE WHEN OCTET_LENGTH(symbol) = 1 "
+    "AND symbol ~ '^[-A-Za-z0-9_.~!*()''/]$' THEN symbol "
+    "ELSE REGEXP_REPLACE(UPPER(ENCODE(CONVERT_TO(symbol, 'UTF8'), 'hex')), "
+    "'(..)', '%%\\1', 'g') END, '' ORDER BY position) "
+    "FROM REGEXP_SPLIT_TO_TABLE({table}.\"image\", '') "
+    'WITH ORDINALITY AS symbols(symbol, position)'
+)
+
+
+class JSONBuildObject(JSONObject):
+    """JSONObject с порядком ключей как в запросе (json, а не jsonb)."""
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            function='JSON_BUILD_OBJECT',
+            **extra_context
+        )
+
+
+class JSONAgg(Aggregate):
+    """Агрегат JSON_AGG(выражение ORDER BY сортировка)."""
+
+    function = 'JSON_AGG'
+    arg_joiner = ' ORDER BY '
+    output_field = JSONField()
+
+    def __init__(self, expression, ordering):
+        super().__init__(expression, ordering)
+
+
+def is_database_json_enabled():
+    return (
+        settings.RECIPE_LIST_ENGINE == 'database'
+        and connection.vendor == 'postgresql'
+    )
+
+
+def get_recipe_json_expressions(request, fields):
+    """Выражения полей RecipeGetSerializer в порядке Meta.fields."""
+    user_id = request.user.pk if request.user.is_authenticated else None
+    tags = Recipe.tags.through.objects.filter(
+        recipe_id=OuterRef('pk')
+    ).values('recipe_id').annotate(
+        data=JSONAgg(
+            JSONBuildObject(
+                id=F('tag__id'),
+                name=F('tag__name'),
+                color=F('tag__color'),
+                slug=F('tag__slug')
+            ),
+            F('tag_id')
+        )
+    ).values('data')
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    expressions = {
+        'id': F('id'),
+        'tags': Coalesce(
+            Subquery(tags, output_field=JSONField()),
+            RawSQL("'[]'::json", (), output_field=JSONField())
+        ),
+        'author': JSONBuildObject(
+            id=F('author__id'),
+            username=F('author__username'),
+            first_name=F('author__first_name'),
+            last_name=F('author__last_name'),
+            email=F('author__email'),
+            is_subscribed=Exists(Follow.objects.filter(
+                user_id=user_id,
+                author_id=OuterRef('author_id')
+            )) if user_id else Value(False, BooleanField())
+        ),
+        'ingredients': RawSQL(
+            INGREDIENTS_JSON_SQL.format(table=table),
+            (),
+            output_field=JSONField()
+        ),
+        'name': F('name'),
+        'image': Case(
+            When(image='', then=Value(None)),
+            default=Concat(
+                Value(request.build_absolute_uri(settings.MEDIA_URL)),
+                RawSQL(
+                    IMAGE_PATH_SQL.format(table=table),
+                    (),
+                    output_field=CharField()
+                )
+            ),
+            output_field=CharField()
+        ),
+        'text': F('text'),
+        'cooking_time': F('cooking_time'),
+        'is_favorited': Exists(Favorite.objects.filter(
+            user_id=user_id,
+            recipe_id=OuterRef('pk')
+        )) if user_id else Value(False, BooleanField()),
+        'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+            user_id=user_id,
+            recipe_id=OuterRef('pk')
+        )) if user_id else Value(False, BooleanField()),
+    }
+    return {
+        name: expression for name, expression in expressions.items()
+        if name in fields
+    }
+
+
+def get_recipe_json_rows(queryset, request, fields):
+    """Представления рецептов выборки в виде строк JSON, собранных базой.
+
+    Ключи, их порядок и значения совпадают с RecipeGetSerializer, пробелы
+    между элементами - нет. Строки читаются итератором в порядке выборки,
+    так что страница и JSON получаются одним запросом.
+    """
+    return queryset.annotate(
+        payload=Cast(
+            JSONBuildObject(**get_recipe_json_expressions(request, fields)),
+            TextField()
+        )
+    ).values_list('payload', flat=True).iterator()
+
+
+def iter_json_array(prefix, rows, suffix, rows_per_chunk=100):
+    """Тело ответа: prefix, строки JSON через запятую и suffix кусками."""
+    chunk = [prefix]
+    for number, row in enumerate(rows):
+        chunk.append(b',' + row.encode() if number else row.encode())
+        if len(chunk) >= rows_per_chunk:
+            yield b''.join(chunk)
+            chunk = []
+    chunk.append(suffix)
+    yield b''.join(chunk)
@@ -0,0 +1,118 @@
+import zlib
+
+from recipes.models import Favorite, Follow, Recipe, ShoppingCart
+
+from .renderers import FastJSONRenderer
+
+USER_RECORD_TYPES = ('favorite', 'shopping_cart', 'follow')
+
+
+def iter_recipe_records(after_id=0, batch_size=500):
+    """Рецепты с авторами, тегами и ингредиентами в порядке id.
+
+    Рецепты читаются пачками по batch_size с предзагрузкой тегов для
+    всей пачки, поэтому память не растет с размером каталога.
+    """
+    while True:
+        recipes = list(
+            Recipe.objects.filter(pk__gt=after_id).order_by(
+                'pk'
+            ).select_related('author').prefetch_related('tags')[:batch_size]
+        )
+        for recipe in recipes:
+            yield {
+                'id': recipe.pk,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'pub_date': recipe.pub_date,
+                'image': recipe.image.name,
+                'author': {
+                    'id': recipe.author.pk,
+                    'username': recipe.author.username,
+                    'email': recipe.author.email,
+                    'first_name': recipe.author.first_name,
+                    'last_name': recipe.author.last_name,
+                },
+                'tags': [
+                    {'id': tag.pk, 'name': tag.name, 'slug': tag.slug}
+                    for tag in recipe.tags.all()
+                ],
+                'ingredients': recipe.ingredients_data,
+            }
+        if len(recipes) < batch_size:
+            return
+        after_id = recipes[-1].pk
+
+
+def parse_user_cursor(cursor):
+    """Разбирает позицию выгрузки пользователя вида 'тип:id'."""
+    if not cursor:
+        return USER_RECORD_TYPES[0], 0
+    record_type, _, record_id = cursor.partition(':')
+    if record_type not in USER_RECORD_TYPES or not record_id.isdigit():
+        raise ValueError(
+            'Позиция задается как тип:id, где тип - один из '
+            f'{", ".join(USER_RECORD_TYPES)}.'
+        )
+    return record_type, int(record_id)
+
+
+def iter_user_records(user, cursor=None, batch_size=500):
+    """Избранное, список покупок и подписки пользователя.
+
+    Каждая запись содержит type и id; пара 'type:id' последней записи
+    позволяет продолжить выгрузку с того же места.
+    """
+    start_type, after_id = parse_user_cursor(cursor)
+    querysets = {
+        'favorite': Favorite.objects.filter(user=user).select_related(
+            'recipe'
+        ),
+        'shopping_cart': ShoppingCart.objects.filter(
+            user=user
+        ).select_related('recipe'),
+        'follow': Follow.objects.filter(user=user).select_related('author'),
+    }
+    for record_type in USER_RECORD_TYPES[
+        USER_RECORD_TYPES.index(start_type):
+    ]:
+        queryset = querysets[record_type].order_by('pk')
+        if record_type == start_type:
+            queryset = queryset.filter(pk__gt=after_id)
+        for item in queryset.iterator(chunk_size=batch_size):
+            record = {'type': record_type, 'id': item.pk}
+            if record_type == 'follow':
+                record['author'] = {
+                    'id': item.author.pk,
+                    'username': item.author.username,
+                }
+            else:
+                record['recipe'] = {
+                    'id': item.recipe.pk,
+                    'name': item.recipe.name,
+                }
+            yield record
+
+
+def iter_ndjson(records, lines_per_chunk=100):
+    """Записи в формате NDJSON, по lines_per_chunk строк в куске."""
+    renderer = FastJSONRenderer()
+    lines = []
+    for record in records:
+        lines.append(renderer.render(record) + b'\n')
+        if len(lines) >= lines_per_chunk:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+def iter_gzip(chunks, level=6):
+    """Сжимает поток кусков в gzip по мере чтения."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
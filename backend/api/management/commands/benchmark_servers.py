@@ -0,0 +1,149 @@
+import os
+import subprocess
+import sys
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from . import loadtest
+
+SERVERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI and ASGI deployments under the same load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Количество процессов gunicorn у каждого сервера.'
+        )
+        parser.add_argument('--wsgi-port', type=int, default=8001)
+        parser.add_argument('--asgi-port', type=int, default=8002)
+        parser.add_argument(
+            '--wsgi-url',
+            help='Адрес уже запущенного WSGI-сервера вместо запуска нового.'
+        )
+        parser.add_argument(
+            '--asgi-url',
+            help='Адрес уже запущенного ASGI-сервера вместо запуска нового.'
+        )
+        parser.add_argument(
+            '--startup-timeout',
+            type=float,
+            default=30,
+            help='Сколько секунд ждать запуска сервера.'
+        )
+        parser.add_argument(
+            '--stages',
+            default='10:10,50:20',
+            help='Расписание нагрузки "пользователей:секунд,...".'
+        )
+        parser.add_argument('--collection', default=None)
+        parser.add_argument('--jsonl')
+        parser.add_argument('--methods', default='GET')
+        parser.add_argument('--user', action='append', default=[])
+        parser.add_argument('--var', action='append', default=[])
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def start_server(self, mode, port, workers):
+        return subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers),
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'SERVER_MODE': mode}
+        )
+
+    @staticmethod
+    def wait_for_server(url, process, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(
+                    f'Сервер {url} завершился с кодом {process.returncode}.'
+                )
+            try:
+                with urlopen(f'{url}/api/tags/', timeout=1):
+                    return
+            except (URLError, OSError):
+                time.sleep(0.5)
+        raise CommandError(f'Сервер {url} не запустился за {timeout} с.')
+
+    def run_load(self, mode, url, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{mode}: {url}'))
+        command = loadtest.Command(stdout=self.stdout, stderr=self.stderr)
+        call_command(
+            command,
+            base_url=url,
+            collection=options['collection'] or str(
+                loadtest.DEFAULT_COLLECTION
+            ),
+            jsonl=options['jsonl'],
+            methods=options['methods'],
+            stages=options['stages'],
+            user=options['user'],
+            var=options['var'],
+            timeout=options['timeout']
+        )
+        return command.results, command.elapsed
+
+    def benchmark(self, mode, options):
+        url = options[f'{mode}_url']
+        if url:
+            return self.run_load(mode, url.rstrip('/'), options)
+        port = options[f'{mode}_port']
+        url = f'http://127.0.0.1:{port}'
+        process = self.start_server(mode, port, options['workers'])
+        try:
+            self.wait_for_server(url, process, options['startup_timeout'])
+            return self.run_load(mode, url, options)
+        finally:
+            process.terminate()
+            process.wait()
+
+    @staticmethod
+    def summarize(results, stage, duration):
+        durations = sorted(
+            value
+            for values in results.durations[stage].values()
+            for value in values
+        )
+        return (
+            len(durations) / duration,
+            sum(results.errors[stage].values()),
+            *(
+                loadtest.percentile(durations, percent) * 1000
+                for percent in (50, 95, 99)
+            ),
+        )
+
+    def handle(self, *args, **options):
+        stages = loadtest.parse_stages(options['stages'])
+        runs = {mode: self.benchmark(mode, options) for mode in SERVERS}
+        self.stdout.write(
+            f'\n{"этап":<22} {"сервер":<6} {"в сек.":>8} {"ошибок":>6} '
+            f'{"p50":>8} {"p95":>8} {"p99":>8}'
+        )
+        for stage, (users, _) in enumerate(stages):
+            for mode, (results, elapsed) in runs.items():
+                rps, errors, *latencies = self.summarize(
+                    results,
+                    stage,
+                    elapsed[stage]
+                )
+                self.stdout.write(
+                    f'{f"{stage + 1}: {users} польз.":<22} {mode:<6} '
+                    f'{rps:>8.1f} {errors:>6} '
+                    + ' '.join(
+                        f'{latency:>6.1f}мс' for latency in latencies
+                    )
+                )
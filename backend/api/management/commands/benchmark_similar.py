@@ -0,0 +1,256 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from api.similarity import build_similar_recipes, invalidate_similar_cache
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag, User
+
+from .loadtest import percentile
+
+BENCHMARK_USERNAME = 'similar-benchmark'
+BENCHMARK_IMAGE = 'recipes/images/similar-benchmark.png'
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic recipes, build the similar '
+        'recipes index and measure /api/recipes/{id}/similar/ latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=0,
+            help='Сколько рецептов должно быть в базе; недостающие '
+                 'создаются синтетическими (0 - не создавать).'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Количество замеряемых запросов.'
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=10,
+            help='Допустимый p95 ответа с заполненным кэшем в мс; при '
+                 'превышении команда завершается с ошибкой (0 - не '
+                 'проверять).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество рецептов в одной вставке.'
+        )
+        parser.add_argument(
+            '--build-batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов в пачке построения индекса.'
+        )
+        parser.add_argument(
+            '--skip-build',
+            action='store_true',
+            help='Не перестраивать индекс похожих рецептов.'
+        )
+        parser.add_argument(
+            '--jsonl',
+            help='Записать замеряемые запросы в JSONL для команды loadtest.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help='Удалить синтетические рецепты и завершиться.'
+        )
+
+    @staticmethod
+    def get_author():
+        author, _ = User.objects.get_or_create(
+            username=BENCHMARK_USERNAME,
+            defaults={
+                'email': f'{BENCHMARK_USERNAME}@example.org',
+                'first_name': 'Benchmark',
+                'last_name': 'Benchmark',
+            }
+        )
+        return author
+
+    def generate_recipes(self, count, batch_size, rng):
+        """Создает count рецептов с ингредиентами по закону Ципфа."""
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list(
+                'pk',
+                'name',
+                'measurement_unit'
+            )
+        )
+        if not ingredients:
+            raise CommandError('В базе нет ингредиентов.')
+        weights = [1 / (rank + 1) for rank in range(len(ingredients))]
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        author = self.get_author()
+        number = Recipe.objects.filter(author=author).count()
+        while count > 0:
+            prepared = []
+            for _ in range(min(batch_size, count)):
+                number += 1
+                recipe_ingredients = [
+                    (ingredient, rng.randint(1, 500))
+                    for ingredient in set(rng.choices(
+                        ingredients,
+                        weights,
+                        k=rng.randint(4, 12)
+                    ))
+                ]
+                prepared.append((
+                    Recipe(
+                        author=author,
+                        name=f'Рецепт для замера {number}',
+                        image=BENCHMARK_IMAGE,
+                        text='Синтетический рецепт.',
+                        cooking_time=rng.randint(5, 180),
+                        ingredients_data=[
+                            {
+                                'id': ingredient_id,
+                                'name': name,
+                                'measurement_unit': measurement_unit,
+                                'amount': amount,
+                            }
+                            for (
+                                ingredient_id,
+                                name,
+                                measurement_unit
+                            ), amount in recipe_ingredients
+                        ]
+                    ),
+                    recipe_ingredients,
+                    rng.sample(tag_ids, min(len(tag_ids), rng.randint(1, 2)))
+                ))
+            self.save_recipes(author, prepared)
+            count -= len(prepared)
+            self.stdout.write(f'Создано рецептов для замера: {number}.')
+
+    @staticmethod
+    @transaction.atomic
+    def save_recipes(author, prepared):
+        recipes = [recipe for recipe, _, _ in prepared]
+        Recipe.objects.bulk_create(recipes)
+        if any(recipe.pk is None for recipe in recipes):
+            pks = dict(Recipe.objects.filter(
+                author=author,
+                name__in=[recipe.name for recipe in recipes]
+            ).values_list('name', 'pk'))
+            for recipe in recipes:
+                recipe.pk = pks[recipe.name]
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredient[0],
+                amount=amount
+            )
+            for recipe, recipe_ingredients, _ in prepared
+            for ingredient, amount in recipe_ingredients
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, _, tag_ids in prepared
+            for tag_id in tag_ids
+        )
+
+    @staticmethod
+    def get_host():
+        for host in settings.ALLOWED_HOSTS:
+            if host == '*':
+                return 'localhost'
+            if not host.startswith('.'):
+                return host
+        return 'localhost'
+
+    def measure(self, client, recipe_ids, cold):
+        """Время ответов на запросы похожих рецептов.
+
+        При cold список похожих удаляется из кэша перед запросом, иначе
+        замеряется повторный запрос с заполненными кэшами.
+        """
+        durations = []
+        for recipe_id in recipe_ids:
+            path = f'/api/recipes/{recipe_id}/similar/'
+            if cold:
+                invalidate_similar_cache(recipe_id)
+            else:
+                client.get(path)
+            start = time.perf_counter()
+            response = client.get(path)
+            durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'Рецепт {recipe_id}: ответ {response.status_code}.'
+                )
+        return sorted(durations)
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = Recipe.objects.filter(
+                author__username=BENCHMARK_USERNAME
+            ).delete()[0]
+            self.stdout.write(f'Удалено объектов: {deleted}.')
+            return
+        rng = random.Random(options['seed'])
+        missing = options['recipes'] - Recipe.objects.count()
+        if missing > 0:
+            self.generate_recipes(missing, options['batch_size'], rng)
+        if not options['skip_build']:
+            start = time.monotonic()
+            recipes_count = build_similar_recipes(options['build_batch_size'])
+            self.stdout.write(
+                f'Индекс построен: {recipes_count} рецептов за '
+                f'{time.monotonic() - start:.1f} с.'
+            )
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        if not recipe_ids:
+            raise CommandError('В базе нет рецептов.')
+        recipe_ids = rng.sample(
+            recipe_ids,
+            min(options['requests'], len(recipe_ids))
+        )
+        if options['jsonl']:
+            with open(options['jsonl'], 'w', encoding='utf-8') as file:
+                for recipe_id in recipe_ids:
+                    file.write(json.dumps({
+                        'method': 'GET',
+                        'path': f'/api/recipes/{recipe_id}/similar/',
+                    }) + '\n')
+        client = Client(HTTP_HOST=self.get_host())
+        with override_settings(THROTTLE_ENABLED=False):
+            results = {
+                'без кэша': self.measure(client, recipe_ids, cold=True),
+                'с кэшем': self.measure(client, recipe_ids, cold=False),
+            }
+        self.stdout.write(
+            f'\n{"запросы":<10} {"количество":>10} '
+            f'{"p50":>8} {"p95":>8} {"p99":>8}'
+        )
+        for name, durations in results.items():
+            self.stdout.write(
+                f'{name:<10} {len(durations):>10} '
+                + ' '.join(
+                    f'{percentile(durations, percent) * 1000:>6.1f}мс'
+                    for percent in (50, 95, 99)
+                )
+            )
+        warm_p95 = percentile(results['с кэшем'], 95) * 1000
+        if options['budget'] and warm_p95 > options['budget']:
+            raise CommandError(
+                f'p95 ответа с кэшем {warm_p95:.1f} мс превышает бюджет '
+                f'{options["budget"]:.0f} мс.'
+            )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Build similar recipes index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов в пачке.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Построение индекса похожих рецептов началось.')
+        start = time.monotonic()
+        recipes_count = build_similar_recipes(options['batch_size'])
+        self.stdout.write(
+            'Построение индекса похожих рецептов закончено: '
+            f'{recipes_count} рецептов за {time.monotonic() - start:.1f} с.'
+        )
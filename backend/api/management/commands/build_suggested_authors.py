@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.suggestions import build_suggested_authors
+
+
+class Command(BaseCommand):
+    help = 'Build suggested authors from the follow graph and favorites'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Построение рекомендуемых авторов началось.')
+        start = time.monotonic()
+        users_count = build_suggested_authors(options['batch_size'])
+        self.stdout.write(
+            'Построение рекомендуемых авторов закончено: '
+            f'{users_count} пользователей за '
+            f'{time.monotonic() - start:.1f} с.'
+        )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from api.cache import invalidate_recipe_cache
+from recipes.models import IngredientRecipe, Recipe
+from recipes.signals import touch_recipes
+
+
+class Command(BaseCommand):
+    help = 'Check that Recipe.ingredients_data matches recipe ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Перезаписать расходящиеся копии.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def check_batch(self, recipe_ids):
+        recipes = Recipe.objects.filter(pk__in=recipe_ids).only(
+            'ingredients_data'
+        ).prefetch_related(
+            Prefetch(
+                'ingredient_in_recipe',
+                queryset=IngredientRecipe.objects.order_by(
+                    'pk'
+                ).select_related('ingredient')
+            )
+        )
+        mismatched = []
+        for recipe in recipes:
+            expected = [
+                {
+                    'id': item.ingredient_id,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_in_recipe.all()
+            ]
+            if recipe.ingredients_data != expected:
+                self.stdout.write(f'Расхождение в рецепте {recipe.pk}.')
+                recipe.ingredients_data = expected
+                mismatched.append(recipe)
+        return mismatched
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        mismatched = []
+        for start in range(0, len(recipe_ids), batch_size):
+            mismatched += self.check_batch(
+                recipe_ids[start:start + batch_size]
+            )
+        if not mismatched:
+            self.stdout.write('Копии ингредиентов рецептов согласованы.')
+            return
+        if not options['fix']:
+            raise CommandError(
+                f'Расхождений: {len(mismatched)}; запустите с --fix.'
+            )
+        Recipe.objects.bulk_update(
+            mismatched,
+            ('ingredients_data',),
+            batch_size=batch_size
+        )
+        touch_recipes(recipe.pk for recipe in mismatched)
+        invalidate_recipe_cache(*(recipe.pk for recipe in mismatched))
+        self.stdout.write(f'Исправлено рецептов: {len(mismatched)}.')
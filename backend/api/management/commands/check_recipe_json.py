@@ -0,0 +1,111 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import User
+
+from .benchmark_similar import Command as BenchmarkSimilarCommand
+
+ENGINES = ('serializer', 'database')
+
+
+def load_ordered(body):
+    """JSON с сохранением порядка ключей объектов."""
+    return json.loads(body, object_pairs_hook=list)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the recipe list built by the database '
+        '(RECIPE_LIST_ENGINE=database) with the serializer output'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            default=[],
+            help='Email пользователя, от имени которого сравниваются '
+                 'ответы (можно повторять); без него - только анонимно.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Рецептов на странице.'
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=5,
+            help='Сколько страниц сравнивать.'
+        )
+
+    @staticmethod
+    def get_body(response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def compare_page(self, client, path):
+        """Различия ответов на path; None, если страницы нет."""
+        bodies = {}
+        for engine in ENGINES:
+            with override_settings(
+                RECIPE_LIST_ENGINE=engine,
+                THROTTLE_ENABLED=False
+            ):
+                response = client.get(path)
+            if response.status_code != 200:
+                return None
+            bodies[engine] = load_ordered(self.get_body(response))
+        expected, actual = (dict(bodies[engine]) for engine in ENGINES)
+        differences = [
+            f'{path}: {key}' for key in ('count', 'next', 'previous')
+            if expected[key] != actual[key]
+        ]
+        if len(expected['results']) != len(actual['results']):
+            differences.append(f'{path}: количество рецептов')
+        for recipe, database_recipe in zip(
+            expected['results'],
+            actual['results']
+        ):
+            if recipe != database_recipe:
+                differences.append(
+                    f'{path}: рецепт {dict(recipe).get("id")}\n'
+                    f'  сериализатор: {recipe}\n'
+                    f'  база данных:  {database_recipe}'
+                )
+        return differences
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Сборка JSON в базе данных работает только на PostgreSQL.'
+            )
+        users = [None]
+        for email in options['user']:
+            try:
+                users.append(User.objects.get(email=email))
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {email} не найден.')
+        client = APIClient(HTTP_HOST=BenchmarkSimilarCommand.get_host())
+        differences = []
+        for user in users:
+            client.force_authenticate(user)
+            for page in range(1, options['pages'] + 1):
+                page_differences = self.compare_page(
+                    client,
+                    f'/api/recipes/?limit={options["limit"]}&page={page}'
+                )
+                if page_differences is None:
+                    break
+                differences += page_differences
+        for difference in differences:
+            self.stdout.write(difference)
+        if differences:
+            raise CommandError(f'Расхождений: {len(differences)}.')
+        self.stdout.write('Ответы совпадают.')
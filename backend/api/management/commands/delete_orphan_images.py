@@ -0,0 +1,58 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe images not referenced by any recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не удалять файлы моложе указанного числа секунд.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только вывести список файлов без удаления.'
+        )
+
+    def handle(self, *args, **options):
+        image_field = Recipe._meta.get_field('image')
+        storage = image_field.storage
+        upload_to = image_field.upload_to
+        referenced = set(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        )
+        min_modified_time = timezone.now() - timedelta(
+            seconds=options['min_age']
+        )
+        try:
+            file_names = storage.listdir(upload_to)[1]
+        except FileNotFoundError:
+            file_names = []
+        deleted_count = 0
+        for file_name in file_names:
+            name = os.path.join(upload_to, file_name)
+            if (
+                name in referenced
+                or storage.get_modified_time(name) > min_modified_time
+            ):
+                continue
+            if not options['dry_run']:
+                # файл мог снова понадобиться после снимка ссылок
+                if (
+                    storage.get_modified_time(name) > min_modified_time
+                    or Recipe.objects.filter(image=name).exists()
+                ):
+                    continue
+                storage.delete(name)
+            self.stdout.write(f'Удаление файла {name}')
+            deleted_count += 1
+        self.stdout.write(f'Неиспользуемых файлов: {deleted_count}.')
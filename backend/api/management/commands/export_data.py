@@ -0,0 +1,78 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import (iter_gzip, iter_ndjson, iter_recipe_records,
+                        iter_user_records, parse_user_cursor)
+from recipes.models import User
+
+
+class Command(BaseCommand):
+    help = 'Export recipes or one user\'s data as NDJSON'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+        recipes_parser = subparsers.add_parser(
+            'recipes',
+            help='Каталог рецептов.'
+        )
+        recipes_parser.add_argument(
+            '--after-id',
+            type=int,
+            default=0,
+            help='Продолжить после рецепта с этим id.'
+        )
+        user_parser = subparsers.add_parser(
+            'user',
+            help='Избранное, список покупок и подписки пользователя.'
+        )
+        user_parser.add_argument('email')
+        user_parser.add_argument(
+            '--after',
+            help='Продолжить после записи тип:id.'
+        )
+        for subparser in (recipes_parser, user_parser):
+            subparser.add_argument('--batch-size', type=int, default=500)
+            subparser.add_argument(
+                '--output',
+                help='Файл для выгрузки (по умолчанию stdout).'
+            )
+            subparser.add_argument(
+                '--gzip',
+                action='store_true',
+                help='Сжимать выгрузку в gzip.'
+            )
+
+    def get_records(self, options):
+        if options['subcommand'] == 'recipes':
+            return iter_recipe_records(
+                options['after_id'],
+                options['batch_size']
+            )
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(
+                f'Пользователь с email {options["email"]} не найден.'
+            )
+        try:
+            parse_user_cursor(options['after'])
+        except ValueError as error:
+            raise CommandError(error)
+        return iter_user_records(
+            user,
+            options['after'],
+            options['batch_size']
+        )
+
+    def handle(self, *args, **options):
+        chunks = iter_ndjson(self.get_records(options))
+        if options['gzip']:
+            chunks = iter_gzip(chunks)
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,399 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import unquote, urlsplit
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image
+
+from api.cache import invalidate_count_cache
+from api.purge import purge_surrogate_keys
+from api.similarity import build_similar_recipes
+from api.tasks import enqueue
+from recipes import constants
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, RecipeChange,
+                            Tag, User)
+
+
+class RecordError(Exception):
+    pass
+
+
+def get_ref(value, key):
+    """Ссылка на объект: значение поля key, а если его нет - id."""
+    if isinstance(value, dict):
+        return value.get(key, value.get('id'))
+    return value
+
+
+def get_refs(values, key):
+    """Разделяет ссылки на объекты на id и значения поля key."""
+    ids, keys = set(), set()
+    for value in values:
+        value = get_ref(value, key)
+        if isinstance(value, int):
+            ids.add(value)
+        elif isinstance(value, str):
+            keys.add(value)
+    return ids, keys
+
+
+def check_small_integer(value, field):
+    if (
+        not isinstance(value, int)
+        or isinstance(value, bool)
+        or not constants.MIN_POSITIVE_INTEGER
+        <= value
+        <= constants.MAX_POSITIVE_SMALL_INTEGER
+    ):
+        raise RecordError(
+            f'{field}: ожидается целое число от '
+            f'{constants.MIN_POSITIVE_INTEGER} до '
+            f'{constants.MAX_POSITIVE_SMALL_INTEGER}.'
+        )
+    return value
+
+
+class Command(BaseCommand):
+    help = 'Bulk import recipes from an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл NDJSON, по одному рецепту в строке.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции.'
+        )
+        parser.add_argument(
+            '--image-root',
+            help='Каталог для относительных путей изображений '
+                 '(по умолчанию каталог файла).'
+        )
+        parser.add_argument(
+            '--image-workers',
+            type=int,
+            default=4,
+            help='Количество потоков обработки изображений.'
+        )
+        parser.add_argument(
+            '--errors',
+            help='Файл NDJSON для записей с ошибками.'
+        )
+
+    @staticmethod
+    def check_types(record):
+        """Проверяет типы полей, по которым пачка ищет связанные объекты."""
+        if not isinstance(get_ref(record.get('author'), 'email'), (int, str)):
+            raise RecordError('Автор: ожидается id или email.')
+        if not isinstance(record.get('name'), str):
+            raise RecordError('Не указано название.')
+        for field in ('tags', 'ingredients'):
+            if not isinstance(record.get(field) or [], list):
+                raise RecordError(f'{field}: ожидается список.')
+        for tag in record.get('tags') or ():
+            if not isinstance(get_ref(tag, 'slug'), (int, str)):
+                raise RecordError('Тег: ожидается id или slug.')
+        for ingredient in record.get('ingredients') or ():
+            if not isinstance(ingredient, dict):
+                raise RecordError('Ингредиент должен быть объектом.')
+            if 'name' in ingredient:
+                if not isinstance(ingredient['name'], str) or not isinstance(
+                    ingredient.get('measurement_unit'),
+                    (str, type(None))
+                ):
+                    raise RecordError(
+                        'Ингредиент: name и measurement_unit должны быть '
+                        'строками.'
+                    )
+            elif not isinstance(ingredient.get('id'), int):
+                raise RecordError('Ингредиент: ожидается id или name.')
+
+    def resolve_batch(self, records):
+        """Загружает авторов, теги и ингредиенты всей пачки разом."""
+        author_ids, emails = get_refs(
+            (record.get('author') for record in records),
+            'email'
+        )
+        tag_ids, slugs = get_refs(
+            (tag for record in records for tag in record.get('tags') or ()),
+            'slug'
+        )
+        ingredients = [
+            ingredient
+            for record in records
+            for ingredient in record.get('ingredients') or ()
+            if isinstance(ingredient, dict)
+        ]
+        ingredient_ids = {
+            ingredient['id'] for ingredient in ingredients
+            if 'name' not in ingredient
+            and isinstance(ingredient.get('id'), int)
+        }
+        ingredient_names = {
+            ingredient['name'] for ingredient in ingredients
+            if isinstance(ingredient.get('name'), str)
+        }
+        self.authors = {}
+        for user in User.objects.filter(
+            Q(pk__in=author_ids) | Q(email__in=emails)
+        ):
+            self.authors[user.pk] = self.authors[user.email] = user
+        self.tags = {}
+        for tag in Tag.objects.filter(Q(pk__in=tag_ids) | Q(slug__in=slugs)):
+            self.tags[tag.pk] = self.tags[tag.slug] = tag
+        self.ingredients = {}
+        for ingredient in Ingredient.objects.filter(
+            Q(pk__in=ingredient_ids) | Q(name__in=ingredient_names)
+        ):
+            self.ingredients[ingredient.pk] = ingredient
+            self.ingredients[
+                (ingredient.name, ingredient.measurement_unit)
+            ] = ingredient
+        self.existing = set(Recipe.objects.filter(
+            author__in=set(self.authors.values()),
+            name__in={record.get('name') for record in records}
+        ).values_list('author_id', 'name'))
+
+    def get_object(self, objects, value, key, kind):
+        value = get_ref(value, key)
+        obj = objects.get(value)
+        if obj is None:
+            raise RecordError(f'{kind} {value!r} не найден.')
+        return obj
+
+    def get_ingredient(self, value):
+        if not isinstance(value, dict):
+            raise RecordError('Ингредиент должен быть объектом.')
+        if 'name' in value:
+            key = (value['name'], value.get('measurement_unit'))
+        else:
+            key = value.get('id')
+        ingredient = self.ingredients.get(key)
+        if ingredient is None:
+            raise RecordError(f'Ингредиент {key!r} не найден.')
+        return ingredient, check_small_integer(value.get('amount'), 'amount')
+
+    def validate(self, record):
+        author = self.get_object(
+            self.authors, record.get('author'), 'email', 'Автор'
+        )
+        name = record.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise RecordError('Не указано название.')
+        if len(name) > constants.MAX_FIELD_LENGTH_DEFAULT:
+            raise RecordError('Слишком длинное название.')
+        if (author.pk, name) in self.existing:
+            raise RecordError(f'У автора уже есть рецепт {name!r}.')
+        text = record.get('text')
+        if not isinstance(text, str) or not text.strip():
+            raise RecordError('Не указан текст.')
+        cooking_time = check_small_integer(
+            record.get('cooking_time'),
+            'cooking_time'
+        )
+        tags = [
+            self.get_object(self.tags, tag, 'slug', 'Тег')
+            for tag in record.get('tags') or ()
+        ]
+        if not tags:
+            raise RecordError('В списке отсутствуют теги.')
+        if len(set(tags)) != len(tags):
+            raise RecordError('В списке есть повторяющиеся теги.')
+        ingredients = [
+            self.get_ingredient(ingredient)
+            for ingredient in record.get('ingredients') or ()
+        ]
+        if not ingredients:
+            raise RecordError('В списке отсутствуют ингредиенты.')
+        if len({ingredient for ingredient, _ in ingredients}) != len(
+            ingredients
+        ):
+            raise RecordError('В списке есть повторяющиеся ингредиенты.')
+        if not isinstance(record.get('image'), str):
+            raise RecordError('Не указано изображение.')
+        self.existing.add((author.pk, name))
+        return {
+            'recipe': Recipe(
+                author=author,
+                name=name,
+                text=text,
+                cooking_time=cooking_time,
+                ingredients_data=[
+                    {
+                        'id': ingredient.pk,
+                        'name': ingredient.name,
+                        'measurement_unit': ingredient.measurement_unit,
+                        'amount': amount,
+                    }
+                    for ingredient, amount in ingredients
+                ],
+            ),
+            'tags': tags,
+            'ingredients': ingredients,
+            'image': record['image'],
+        }
+
+    def store_image(self, image):
+        """Проверяет изображение и сохраняет его в хранилище рецептов."""
+        url = urlsplit(image)
+        if url.scheme not in ('', 'file'):
+            raise RecordError('Поддерживаются только локальные файлы.')
+        path = unquote(url.path) if url.scheme else image
+        path = os.path.join(self.image_root, path)
+        image_field = Recipe._meta.get_field('image')
+        try:
+            with Image.open(path) as picture:
+                picture.verify()
+            with open(path, 'rb') as file:
+                return image_field.storage.save(
+                    image_field.upload_to + os.path.basename(path),
+                    File(file)
+                )
+        except (OSError, SyntaxError) as error:
+            raise RecordError(f'Изображение {image}: {error}')
+
+    def save(self, prepared):
+        recipes = [item['recipe'] for item in prepared]
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            if any(recipe.pk is None for recipe in recipes):
+                pks = {
+                    (author_id, name): pk
+                    for pk, author_id, name in Recipe.objects.filter(
+                        author__in={recipe.author_id for recipe in recipes},
+                        name__in={recipe.name for recipe in recipes}
+                    ).values_list('pk', 'author_id', 'name')
+                }
+                for recipe in recipes:
+                    recipe.pk = pks[(recipe.author_id, recipe.name)]
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=item['recipe'].pk, tag=tag)
+                for item in prepared
+                for tag in item['tags']
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=item['recipe'],
+                    ingredient=ingredient,
+                    amount=amount
+                )
+                for item in prepared
+                for ingredient, amount in item['ingredients']
+            )
+            RecipeChange.objects.bulk_create(
+                RecipeChange(recipe_id=recipe.pk, action=RecipeChange.CREATED)
+                for recipe in recipes
+            )
+
+    def import_batch(self, lines, pool):
+        records = []
+        for line_number, line in lines:
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('Ожидается объект JSON.')
+                self.check_types(record)
+            except (ValueError, RecordError) as error:
+                self.report_error(line_number, line, error)
+            else:
+                records.append((line_number, line, record))
+        self.resolve_batch([record for _, _, record in records])
+        prepared = []
+        for line_number, line, record in records:
+            try:
+                item = self.validate(record)
+            except RecordError as error:
+                self.report_error(line_number, line, error)
+            else:
+                prepared.append((line_number, line, item))
+
+        def store_image(item):
+            try:
+                return self.store_image(item[2]['image'])
+            except RecordError as error:
+                return error
+
+        valid = []
+        for (line_number, line, item), image in zip(
+            prepared,
+            pool.map(store_image, prepared)
+        ):
+            if isinstance(image, RecordError):
+                self.report_error(line_number, line, image)
+                continue
+            item['recipe'].image = image
+            valid.append(item)
+        if valid:
+            self.save(valid)
+        return len(valid)
+
+    def report_error(self, line_number, line, error):
+        self.errors_count += 1
+        self.stderr.write(f'Строка {line_number}: {error}')
+        if self.errors_file:
+            self.errors_file.write(json.dumps(
+                {'line': line_number, 'error': str(error), 'record': line},
+                ensure_ascii=False
+            ) + '\n')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.image_root = options['image_root'] or os.path.dirname(
+            os.path.abspath(path)
+        )
+        self.errors_count = 0
+        self.errors_file = None
+        imported = 0
+        start = time.monotonic()
+        try:
+            file = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        if options['errors']:
+            self.errors_file = open(options['errors'], 'w', encoding='utf-8')
+        lines = (
+            (line_number, line.strip())
+            for line_number, line in enumerate(file, start=1)
+            if line.strip()
+        )
+        try:
+            with ThreadPoolExecutor(options['image_workers']) as pool:
+                while True:
+                    batch = list(islice(lines, options['batch_size']))
+                    if not batch:
+                        break
+                    batch_start = time.monotonic()
+                    batch_imported = self.import_batch(batch, pool)
+                    imported += batch_imported
+                    self.stdout.write(
+                        f'Строки {batch[0][0]}-{batch[-1][0]}: импортировано '
+                        f'{batch_imported} из {len(batch)}, '
+                        f'{len(batch) / (time.monotonic() - batch_start):.0f} '
+                        'записей/с.'
+                    )
+        finally:
+            if file is not sys.stdin:
+                file.close()
+            if self.errors_file:
+                self.errors_file.close()
+            # зафиксированные пачки остаются в базе и при ошибке импорта
+            if imported:
+                invalidate_count_cache()
+                purge_surrogate_keys('recipes')
+                enqueue(build_similar_recipes)
+        duration = time.monotonic() - start
+        self.stdout.write(
+            f'Импортировано рецептов: {imported}, ошибок: '
+            f'{self.errors_count}, {duration:.1f} с '
+            f'({imported / (duration or 1):.0f} рецептов/с).'
+        )
@@ -0,0 +1,403 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Ingredient, Recipe, Tag, User
+
+DEFAULT_COLLECTION = (
+    settings.BASE_DIR.parent
+    / 'postman-collection'
+    / 'diploma.postman_collection.json'
+)
+re_variable = re.compile(r'{{(\w+)}}')
+re_id = re.compile(r'/\d+(?=/|$)')
+
+
+def parse_stages(value):
+    """Разбирает расписание вида '5:10,20:30' (пользователей:секунд)."""
+    try:
+        stages = [
+            (int(users), float(duration))
+            for users, duration in (
+                stage.split(':') for stage in value.split(',')
+            )
+        ]
+    except ValueError:
+        raise CommandError(
+            'Расписание задается как "пользователей:секунд,...".'
+        )
+    if not stages or any(
+        users < 1 or duration <= 0 for users, duration in stages
+    ):
+        raise CommandError('Пустое или некорректное расписание.')
+    return stages
+
+
+def get_route(method, path):
+    """Маршрут для отчета: id заменены на {id}, из запроса - только ключи."""
+    url = urlsplit(path)
+    route = re_id.sub('/{id}', url.path)
+    if url.query:
+        keys = sorted({
+            param.split('=')[0] for param in url.query.split('&') if param
+        })
+        route += '?' + '&'.join(keys)
+    return f'{method} {route}'
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга для отсортированного списка."""
+    if not values:
+        return 0
+    rank = max(round(percent / 100 * len(values) + 0.5) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Workload:
+    """Набор запросов для воспроизведения."""
+
+    def __init__(self, requests):
+        if not requests:
+            raise CommandError('Нет запросов для воспроизведения.')
+        self.requests = requests
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            request = self.requests[self.position % len(self.requests)]
+            self.position += 1
+            return request
+
+    @classmethod
+    def from_jsonl(cls, path, methods):
+        """Запросы из файла JSONL.
+
+        Каждая строка - объект с ключами method, path и необязательными
+        body (JSON тела запроса) и auth (нужен ли токен пользователя).
+        """
+        requests = []
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                method = item.get('method', 'GET').upper()
+                if method in methods:
+                    requests.append({
+                        'method': method,
+                        'path': item['path'],
+                        'body': item.get('body'),
+                        'auth': bool(item.get('auth')),
+                    })
+        return cls(requests)
+
+    @classmethod
+    def from_postman(cls, path, methods, variables):
+        """Запросы postman-коллекции с подставленными переменными.
+
+        Запросы с неизвестными переменными пропускаются; токены из
+        авторизации apikey заменяются токенами виртуальных пользователей.
+        """
+        with open(path, encoding='utf-8') as file:
+            collection = json.load(file)
+        variables = {
+            **{
+                variable['key']: variable['value']
+                for variable in collection.get('variable', ())
+            },
+            **variables,
+        }
+        requests = []
+        skipped = 0
+        for item in cls.walk(collection['item']):
+            request = item['request']
+            if request['method'] not in methods:
+                continue
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            body = request.get('body', {}).get('raw') or None
+            try:
+                url, body = (
+                    re_variable.sub(lambda match: variables[match[1]], value)
+                    if value else value
+                    for value in (url, body)
+                )
+            except KeyError:
+                skipped += 1
+                continue
+            auth = request.get('auth') or {}
+            requests.append({
+                'method': request['method'],
+                'path': urlsplit(url)._replace(scheme='', netloc='').geturl(),
+                'body': json.loads(body) if body else None,
+                'auth': auth.get('type') == 'apikey' or any(
+                    header['key'] == 'Authorization'
+                    for header in request.get('header', ())
+                ),
+            })
+        workload = cls(requests)
+        workload.skipped = skipped
+        return workload
+
+    @classmethod
+    def walk(cls, items):
+        for item in items:
+            if 'item' in item:
+                yield from cls.walk(item['item'])
+            else:
+                yield item
+
+
+class Results:
+    """Длительности ответов по этапам расписания и маршрутам."""
+
+    def __init__(self):
+        self.durations = defaultdict(lambda: defaultdict(list))
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add(self, stage, route, duration, error):
+        with self.lock:
+            self.durations[stage][route].append(duration)
+            if error:
+                self.errors[stage][route] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the Postman collection or a JSONL request log against '
+        'a running server and report latency percentiles per route'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--collection',
+            default=str(DEFAULT_COLLECTION),
+            help='Postman-коллекция (v2.1).'
+        )
+        parser.add_argument(
+            '--jsonl',
+            help='Журнал запросов JSONL вместо postman-коллекции.'
+        )
+        parser.add_argument(
+            '--methods',
+            default='GET',
+            help='Воспроизводимые методы через запятую.'
+        )
+        parser.add_argument(
+            '--stages',
+            default='5:10,10:20,20:30',
+            help='Расписание нагрузки "пользователей:секунд,...".'
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            default=[],
+            help='Учетные данные виртуального пользователя email:пароль.'
+        )
+        parser.add_argument(
+            '--var',
+            action='append',
+            default=[],
+            help='Значение переменной коллекции name=value.'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def get_default_variables(self):
+        """Переменные коллекции, которые она заполняет в своих тестах."""
+        tags = list(Tag.objects.values_list('id', 'slug')[:3])
+        variables = {
+            'userId': User.objects.values_list('id', flat=True).first(),
+            'firstRecipeId': Recipe.objects.values_list(
+                'id', flat=True
+            ).first(),
+            'firstIndredientId': Ingredient.objects.values_list(
+                'id', flat=True
+            ).first(),
+            'ingredientNameFirstLatter': Ingredient.objects.values_list(
+                'name', flat=True
+            ).first(),
+        }
+        if tags:
+            variables['firstTagId'] = tags[0][0]
+        for name, (_, slug) in zip(
+            ('firstTagSlug', 'secondTagSlug', 'thirdTagSlug'), tags
+        ):
+            variables[name] = slug
+        if variables['ingredientNameFirstLatter']:
+            variables['ingredientNameFirstLatter'] = (
+                variables['ingredientNameFirstLatter'][0]
+            )
+        return {
+            name: str(value) for name, value in variables.items()
+            if value is not None
+        }
+
+    def login(self, base_url, credentials, timeout):
+        tokens = []
+        for credential in credentials:
+            email, _, password = credential.partition(':')
+            request = Request(
+                f'{base_url}/api/auth/token/login/',
+                data=json.dumps({
+                    'email': email,
+                    'password': password,
+                }).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            try:
+                with urlopen(request, timeout=timeout) as response:
+                    tokens.append(json.load(response)['auth_token'])
+            except (HTTPError, URLError, KeyError) as error:
+                raise CommandError(f'Не удалось войти как {email}: {error}')
+        return tokens
+
+    def send(self, base_url, request, token, timeout):
+        headers = {'Accept-Encoding': 'gzip'}
+        data = None
+        if request['body'] is not None:
+            data = json.dumps(request['body']).encode()
+            headers['Content-Type'] = 'application/json'
+        if request['auth'] and token:
+            headers['Authorization'] = f'Token {token}'
+        start = time.perf_counter()
+        try:
+            with urlopen(
+                Request(
+                    base_url + request['path'],
+                    data=data,
+                    headers=headers,
+                    method=request['method']
+                ),
+                timeout=timeout
+            ) as response:
+                response.read()
+                error = False
+        except HTTPError as response:
+            response.read()
+            error = response.code >= 500
+        except (URLError, OSError):
+            error = True
+        return time.perf_counter() - start, error
+
+    def run_stages(self, workload, stages, tokens, options):
+        results = Results()
+        state = {'stage': None, 'users': 0, 'stopped': False}
+
+        def virtual_user(number):
+            token = tokens[number % len(tokens)] if tokens else None
+            while not state['stopped']:
+                if number >= state['users']:
+                    time.sleep(0.05)
+                    continue
+                stage = state['stage']
+                request = workload.next()
+                duration, error = self.send(
+                    options['base_url'],
+                    request,
+                    token,
+                    options['timeout']
+                )
+                results.add(
+                    stage,
+                    get_route(request['method'], request['path']),
+                    duration,
+                    error
+                )
+
+        threads = [
+            threading.Thread(target=virtual_user, args=(number,), daemon=True)
+            for number in range(max(users for users, _ in stages))
+        ]
+        for thread in threads:
+            thread.start()
+        elapsed = []
+        try:
+            for stage, (users, duration) in enumerate(stages):
+                state['stage'] = stage
+                state['users'] = users
+                start = time.perf_counter()
+                time.sleep(duration)
+                elapsed.append(time.perf_counter() - start)
+        finally:
+            state['stopped'] = True
+            for thread in threads:
+                thread.join(options['timeout'])
+        return results, elapsed
+
+    def report(self, results, stages, elapsed):
+        for stage, ((users, _), duration) in enumerate(zip(stages, elapsed)):
+            routes = results.durations[stage]
+            total = sum(len(values) for values in routes.values())
+            errors = sum(results.errors[stage].values())
+            self.stdout.write(
+                f'\nЭтап {stage + 1}: {users} пользователей, '
+                f'{duration:.1f} с, {total} запросов, '
+                f'{total / duration:.1f} запросов/с, ошибок: {errors}'
+            )
+            self.stdout.write(
+                f'{"маршрут":<55} {"запросов":>8} {"ошибок":>6} '
+                f'{"в сек.":>7} {"p50":>8} {"p95":>8} {"p99":>8}'
+            )
+            for route, values in sorted(routes.items()):
+                values.sort()
+                self.stdout.write(
+                    f'{route:<55} {len(values):>8} '
+                    f'{results.errors[stage][route]:>6} '
+                    f'{len(values) / duration:>7.1f} '
+                    + ' '.join(
+                        f'{percentile(values, percent) * 1000:>6.1f}мс'
+                        for percent in (50, 95, 99)
+                    )
+                )
+
+    def handle(self, *args, **options):
+        options['base_url'] = options['base_url'].rstrip('/')
+        methods = {
+            method.strip().upper()
+            for method in options['methods'].split(',')
+        }
+        stages = parse_stages(options['stages'])
+        if options['jsonl']:
+            workload = Workload.from_jsonl(options['jsonl'], methods)
+        else:
+            workload = Workload.from_postman(
+                options['collection'],
+                methods,
+                {
+                    **self.get_default_variables(),
+                    **dict(var.split('=', 1) for var in options['var']),
+                }
+            )
+            if workload.skipped:
+                self.stdout.write(
+                    f'Пропущено запросов с неизвестными переменными: '
+                    f'{workload.skipped}.'
+                )
+        tokens = self.login(
+            options['base_url'],
+            options['user'],
+            options['timeout']
+        )
+        self.stdout.write(
+            f'Запросов в сценарии: {len(workload.requests)}, '
+            f'виртуальных пользователей с токенами: {len(tokens)}.'
+        )
+        self.results, self.elapsed = self.run_stages(
+            workload,
+            stages,
+            tokens,
+            options
+        )
+        self.report(self.results, stages, self.elapsed)
@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.memory import clear_memory_samples, get_memory_samples
+
+
+class Command(BaseCommand):
+    help = 'Show per-view memory samples recorded by MemoryProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+        subparsers.add_parser(
+            'views',
+            help='Пиковое и оставшееся выделение памяти по представлениям.'
+        )
+        allocations_parser = subparsers.add_parser(
+            'allocations',
+            help='Крупнейшие места выделения памяти представления.'
+        )
+        allocations_parser.add_argument('view', help='Имя представления.')
+        allocations_parser.add_argument('--limit', type=int, default=20)
+        workers_parser = subparsers.add_parser(
+            'workers',
+            help='Рост RSS рабочих процессов и оценка max_requests.'
+        )
+        workers_parser.add_argument(
+            '--rss-limit',
+            type=float,
+            help='Допустимый RSS процесса в МБ для оценки max_requests.'
+        )
+        subparsers.add_parser('clear', help='Очистить буфер замеров.')
+
+    def handle(self, *args, **options):
+        if options['subcommand'] == 'clear':
+            clear_memory_samples()
+            self.stdout.write('Буфер замеров памяти очищен.')
+            return
+        samples = get_memory_samples()
+        if not samples:
+            raise CommandError('Замеры не найдены.')
+        getattr(self, f'handle_{options["subcommand"]}')(samples, options)
+
+    def handle_views(self, samples, options):
+        views = defaultdict(list)
+        for sample in samples:
+            views[sample['view']].append(sample)
+        self.stdout.write(
+            f'{"представление":<40} {"замеров":>7} {"пик сред.":>10} '
+            f'{"пик макс.":>10} {"остаток сред.":>13} {"остаток макс.":>13}'
+        )
+        for view, view_samples in sorted(
+            views.items(),
+            key=lambda item: max(sample['peak_kb'] for sample in item[1]),
+            reverse=True
+        ):
+            peaks = [sample['peak_kb'] for sample in view_samples]
+            retained = [sample['retained_kb'] for sample in view_samples]
+            self.stdout.write(
+                f'{str(view):<40} {len(view_samples):>7} '
+                f'{sum(peaks) / len(peaks):>8.1f}КБ {max(peaks):>8.1f}КБ '
+                f'{sum(retained) / len(retained):>11.1f}КБ '
+                f'{max(retained):>11.1f}КБ'
+            )
+        self.stdout.write(f'Замеров: {len(samples)}.')
+
+    def handle_allocations(self, samples, options):
+        samples = [
+            sample for sample in samples if sample['view'] == options['view']
+        ]
+        if not samples:
+            raise CommandError(
+                f'Замеры представления {options["view"]} не найдены.'
+            )
+        sizes = defaultdict(float)
+        counts = defaultdict(int)
+        for sample in samples:
+            for allocation in sample['top']:
+                sizes[allocation['location']] += allocation['size_kb']
+                counts[allocation['location']] += allocation['count']
+        for location, size in sorted(
+            sizes.items(),
+            key=lambda item: item[1],
+            reverse=True
+        )[:options['limit']]:
+            self.stdout.write(
+                f'{size / len(samples):>10.1f}КБ '
+                f'{counts[location] / len(samples):>8.0f} блоков  {location}'
+            )
+        self.stdout.write(
+            f'Среднее по {len(samples)} замерам оставшихся после запроса '
+            'выделений.'
+        )
+
+    def handle_workers(self, samples, options):
+        workers = defaultdict(list)
+        for sample in samples:
+            workers[sample['pid']].append(sample)
+        self.stdout.write(
+            f'{"процесс":>8} {"запросов":>9} {"RSS":>10} '
+            f'{"рост на запрос":>15} {"max_requests":>13}'
+        )
+        for pid, worker_samples in sorted(workers.items()):
+            worker_samples.sort(key=lambda sample: sample['request_number'])
+            first, last = worker_samples[0], worker_samples[-1]
+            handled = last['request_number'] - first['request_number']
+            growth = (last['rss_kb'] - first['rss_kb']) / handled if (
+                handled
+            ) else 0
+            max_requests = '-'
+            if options['rss_limit'] and growth > 0:
+                baseline = first['rss_kb'] - growth * first['request_number']
+                max_requests = str(max(
+                    int((options['rss_limit'] * 1024 - baseline) / growth),
+                    0
+                ))
+            self.stdout.write(
+                f'{pid:>8} {last["request_number"]:>9} '
+                f'{last["rss_kb"] / 1024:>8.1f}МБ {growth:>13.1f}КБ '
+                f'{max_requests:>13}'
+            )
@@ -0,0 +1,73 @@
+import io
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import get_profile_files, make_profile_token
+from recipes.models import User
+
+
+class Command(BaseCommand):
+    help = 'List, aggregate and print stored request profiles'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+        list_parser = subparsers.add_parser(
+            'list',
+            help='Список сохраненных профилей.'
+        )
+        list_parser.add_argument('--view', help='Имя представления.')
+        top_parser = subparsers.add_parser(
+            'top',
+            help='Самые затратные функции по всем профилям.'
+        )
+        top_parser.add_argument('--view', help='Имя представления.')
+        top_parser.add_argument('--limit', type=int, default=30)
+        top_parser.add_argument(
+            '--sort',
+            default='cumulative',
+            choices=('cumulative', 'tottime', 'ncalls'),
+        )
+        token_parser = subparsers.add_parser(
+            'token',
+            help='Значение заголовка X-Profile для сотрудника.'
+        )
+        token_parser.add_argument('email')
+
+    def handle(self, *args, **options):
+        getattr(self, f'handle_{options["subcommand"]}')(options)
+
+    def handle_list(self, options):
+        profile_files = get_profile_files(options['view'])
+        for path, info in profile_files:
+            self.stdout.write(
+                f'{path.name}: {info["view"]}, {info["queries"]} запросов '
+                f'к БД, {info["duration"]} мс'
+            )
+        self.stdout.write(f'Профилей: {len(profile_files)}.')
+
+    def handle_top(self, options):
+        profile_files = get_profile_files(options['view'])
+        if not profile_files:
+            raise CommandError('Профили не найдены.')
+        output = io.StringIO()
+        stats = pstats.Stats(
+            *(str(path) for path, _ in profile_files),
+            stream=output
+        )
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(
+            options['limit']
+        )
+        self.stdout.write(f'Профилей: {len(profile_files)}.')
+        self.stdout.write(output.getvalue())
+
+    def handle_token(self, options):
+        user = User.objects.filter(
+            email=options['email'],
+            is_staff=True
+        ).first()
+        if user is None:
+            raise CommandError(
+                f'Сотрудник с email {options["email"]} не найден.'
+            )
+        self.stdout.write(make_profile_token(user))
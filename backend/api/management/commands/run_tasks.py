@@ -0,0 +1,78 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from api.suggestions import schedule_suggested_authors_refresh
+from api.tasks import delete_finished_tasks, run_tasks
+
+CLEANUP_INTERVAL = 600
+
+
+def work(batch_size, poll_interval, once):
+    last_cleanup = 0
+    while True:
+        close_old_connections()
+        if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+            delete_finished_tasks()
+            schedule_suggested_authors_refresh()
+            last_cleanup = time.monotonic()
+        if run_tasks(batch_size):
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background tasks from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.TASK_WORKER_PROCESSES,
+            help='Количество процессов-обработчиков.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач процесс забирает за раз.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Пауза между проверками пустой очереди, с.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        worker_args = (
+            options['batch_size'],
+            options['poll_interval'],
+            options['once'],
+        )
+        if options['processes'] <= 1:
+            work(*worker_args)
+            return
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=worker_args)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,123 @@
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from recipes.models import Ingredient, Recipe, Tag
+
+
+class GatewayCache:
+    """Модель микрокэша шлюза из gateway/nginx.conf.
+
+    Кэшируются ответы 200 на анонимные GET-запросы к рецептам, тегам и
+    ингредиентам на ttl секунд; запросы с Authorization идут в обход кэша.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.stats = {'hit': 0, 'miss': 0, 'expired': 0, 'bypass': 0}
+
+    def purge(self, keys):
+        self.entries = {
+            url: entry for url, entry in self.entries.items()
+            if not keys & entry['keys']
+        }
+
+    def get(self, client, url, now, authorized):
+        if authorized:
+            self.stats['bypass'] += 1
+            return client.get(url)
+        entry = self.entries.get(url)
+        if entry is not None and entry['expires'] > now:
+            self.stats['hit'] += 1
+            return entry['response']
+        self.stats['expired' if entry is not None else 'miss'] += 1
+        response = client.get(url)
+        if response.status_code == 200:
+            self.entries[url] = {
+                'response': response,
+                'expires': now + self.ttl,
+                'keys': set(response.get('Surrogate-Key', '').split()),
+            }
+        return response
+
+
+class Command(BaseCommand):
+    help = 'Simulate gateway micro-caching of anonymous API traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--rps', type=float, default=100,
+                            help='Запросов в секунду модельного времени.')
+        parser.add_argument('--ttl', type=float, default=5,
+                            help='Время жизни ответа в кэше, с.')
+        parser.add_argument('--anonymous-share', type=float, default=0.8)
+        parser.add_argument('--writes-per-minute', type=float, default=6,
+                            help='Частота изменений рецептов (очисток кэша).')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def get_urls(self):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        prefixes = sorted({
+            name[:2] for name in Ingredient.objects.values_list(
+                'name', flat=True
+            )[:500]
+        })
+        urls = [f'/api/recipes/?page={page}' for page in range(1, 6)]
+        urls += [f'/api/recipes/?tags={slug}' for slug in tag_slugs]
+        urls += ['/api/tags/']
+        urls += [f'/api/recipes/{pk}/' for pk in recipe_ids]
+        urls += [f'/api/ingredients/?name={prefix}' for prefix in prefixes]
+        return urls, recipe_ids
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        urls, recipe_ids = self.get_urls()
+        weights = [1 / rank for rank in range(1, len(urls) + 1)]
+        gateway_cache = GatewayCache(options['ttl'])
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost'
+        ).lstrip('.')
+        client = Client(HTTP_HOST=host)
+        write_interval = (
+            60 / options['writes_per_minute']
+            if options['writes_per_minute'] else None
+        )
+        next_write = write_interval
+        purges = 0
+        for number, url in enumerate(
+            rng.choices(urls, weights, k=options['requests'])
+        ):
+            now = number / options['rps']
+            if write_interval and recipe_ids and now >= next_write:
+                recipe_id = rng.choice(recipe_ids)
+                gateway_cache.purge({'recipes-list', f'recipes-{recipe_id}'})
+                purges += 1
+                next_write += write_interval
+            gateway_cache.get(
+                client,
+                url,
+                now,
+                rng.random() >= options['anonymous_share']
+            )
+
+        stats = gateway_cache.stats
+        anonymous = stats['hit'] + stats['miss'] + stats['expired']
+        origin = anonymous - stats['hit'] + stats['bypass']
+        self.stdout.write(
+            f'Запросов: {options["requests"]}, анонимных: {anonymous}, '
+            f'с авторизацией: {stats["bypass"]}, очисток кэша: {purges}.'
+        )
+        self.stdout.write(
+            f'HIT: {stats["hit"]}, MISS: {stats["miss"]}, '
+            f'EXPIRED: {stats["expired"]}, BYPASS: {stats["bypass"]}.'
+        )
+        self.stdout.write(
+            'Доля попаданий среди анонимных запросов: '
+            f'{stats["hit"] / (anonymous or 1):.1%}; '
+            f'до бэкенда дошло {origin / options["requests"]:.1%} запросов.'
+        )
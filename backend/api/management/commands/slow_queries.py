@@ -0,0 +1,79 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from api.slow_queries import clear_slow_queries, get_slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Show slow database queries recorded by SlowQueryMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Имя представления.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--group',
+            action='store_true',
+            help='Сгруппировать записи по отпечатку SQL.'
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Вывести планы выполнения.'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Очистить буфер.'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_slow_queries()
+            self.stdout.write('Буфер медленных запросов очищен.')
+            return
+        entries = [
+            entry for entry in get_slow_queries()
+            if options['view'] is None or entry['view'] == options['view']
+        ]
+        if options['group']:
+            self.print_groups(entries, options)
+        else:
+            self.print_entries(entries[:options['limit']], options)
+        self.stdout.write(f'Записей: {len(entries)}.')
+
+    def print_entries(self, entries, options):
+        for entry in entries:
+            self.stdout.write(
+                f'{datetime.fromtimestamp(entry["time"]):%Y-%m-%d %H:%M:%S} '
+                f'{entry["duration_ms"]} мс {entry["method"]} '
+                f'{entry["path"]} ({entry["view"]}) '
+                f'[{entry["fingerprint"]}]'
+            )
+            self.stdout.write(f'  {entry["sql"]}')
+            if options['explain'] and entry['explain']:
+                for line in entry['explain'].splitlines():
+                    self.stdout.write(f'    {line}')
+
+    def print_groups(self, entries, options):
+        groups = defaultdict(list)
+        for entry in entries:
+            groups[entry['fingerprint']].append(entry)
+        groups = sorted(
+            groups.values(),
+            key=lambda group: sum(entry['duration_ms'] for entry in group),
+            reverse=True
+        )
+        for group in groups[:options['limit']]:
+            durations = [entry['duration_ms'] for entry in group]
+            self.stdout.write(
+                f'[{group[0]["fingerprint"]}] {len(group)} раз, '
+                f'всего {sum(durations):.2f} мс, '
+                f'максимум {max(durations)} мс; представления: '
+                f'{", ".join(sorted({str(entry["view"]) for entry in group}))}'
+            )
+            self.stdout.write(f'  {group[0]["sql"]}')
+            if options['explain'] and group[0]['explain']:
+                for line in group[0]['explain'].splitlines():
+                    self.stdout.write(f'    {line}')
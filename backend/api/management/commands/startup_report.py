@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном интерпретаторе: текущий процесс уже настроен
+STARTUP_SCRIPT = '''
+import json
+import time
+
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - start) * 1000,
+    'urls_ms': (urls - setup) * 1000,
+}))
+'''
+
+
+def parse_import_times(output):
+    """Разбирает вывод python -X importtime: (модуль, собственное, общее)."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split(
+            '|'
+        )
+        if not self_us.strip().isdigit():
+            continue
+        imports.append(
+            (module.strip(), int(self_us) / 1000, int(cumulative_us) / 1000)
+        )
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Report import and startup time of django.setup() and URLconf'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=3,
+            help='Количество замеров; в отчет идет лучший.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Количество самых медленных модулей и пакетов.'
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=settings.STARTUP_TIME_BUDGET_MS,
+            help='Допустимое время запуска в мс; при превышении команда '
+                 'завершается с ошибкой (0 - не проверять).'
+        )
+
+    @staticmethod
+    def run_startup(*python_options):
+        result = subprocess.run(
+            [sys.executable, *python_options, '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': os.environ.get(
+                    'DJANGO_SETTINGS_MODULE',
+                    'foodgram_backend.settings'
+                ),
+            },
+            capture_output=True,
+            text=True
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        timings = min(
+            (self.run_startup()[0] for _ in range(options['runs'])),
+            key=lambda timing: timing['setup_ms'] + timing['urls_ms']
+        )
+        _, output = self.run_startup('-X', 'importtime')
+        imports = parse_import_times(output)
+        packages = defaultdict(float)
+        for module, self_ms, _ in imports:
+            packages[module.split('.')[0]] += self_ms
+        self.stdout.write(f'{"пакет":<40} {"мс":>8}')
+        for package, duration in sorted(
+            packages.items(),
+            key=lambda item: item[1],
+            reverse=True
+        )[:options['limit']]:
+            self.stdout.write(f'{package:<40} {duration:>8.1f}')
+        self.stdout.write(
+            f'\n{"модуль":<50} {"собств.":>8} {"всего":>8}'
+        )
+        for module, self_ms, cumulative_ms in sorted(
+            imports,
+            key=lambda item: item[2],
+            reverse=True
+        )[:options['limit']]:
+            self.stdout.write(
+                f'{module:<50} {self_ms:>8.1f} {cumulative_ms:>8.1f}'
+            )
+        total = timings['setup_ms'] + timings['urls_ms']
+        self.stdout.write(
+            f'\ndjango.setup(): {timings["setup_ms"]:.1f} мс, загрузка '
+            f'URL: {timings["urls_ms"]:.1f} мс, всего {total:.1f} мс.'
+        )
+        if options['budget'] and total > options['budget']:
+            raise CommandError(
+                f'Время запуска {total:.1f} мс превышает бюджет '
+                f'{options["budget"]:.0f} мс.'
+            )
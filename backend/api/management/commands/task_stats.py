@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.tasks import get_queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Show background task queue depth and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=3600,
+            help='Период для задержек выполнения, с.'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_queue_stats(options['window'])
+        self.stdout.write(
+            'Задач в очереди: '
+            + ', '.join(
+                f'{status}: {count}'
+                for status, count in stats['depth'].items()
+            )
+        )
+        self.stdout.write(
+            'Самая старая готовая задача ждет '
+            f'{stats["oldest_pending_age"]:.1f} с.'
+        )
+        self.stdout.write(
+            f'Выполнено за период: {stats["done"]}; задержка p50 '
+            f'{stats["latency_p50"]:.2f} с, p95 {stats["latency_p95"]:.2f} с, '
+            f'максимум {stats["latency_max"]:.2f} с.'
+        )
@@ -0,0 +1,122 @@
+import os
+import resource
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+
+MEMORY_CURSOR_KEY = 'memory_samples:cursor'
+MEMORY_SLOT_KEY = 'memory_samples:{}'
+
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def get_rss_kb():
+    """Текущий размер резидентной памяти процесса в КБ."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemorySampler:
+    """Пиковые и оставшиеся после запроса выделения памяти.
+
+    Если tracemalloc еще не запущен, трассировка включается только на
+    время запроса, и все оставшиеся в конце выделения относятся к нему;
+    иначе сравниваются снимки до и после запроса. tracemalloc видит
+    выделения всех потоков процесса, поэтому замеры точны для
+    однопоточных рабочих процессов.
+    """
+
+    def __init__(self):
+        self.started = not tracemalloc.is_tracing()
+        self.before = None
+        if self.started:
+            tracemalloc.start(settings.MEMORY_PROFILING_FRAMES)
+            self.base = 0
+        else:
+            self.before = tracemalloc.take_snapshot().filter_traces(
+                TRACE_FILTERS
+            )
+            self.base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    def finish(self):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+        if self.started:
+            tracemalloc.stop()
+        key_type = (
+            'traceback' if settings.MEMORY_PROFILING_FRAMES > 1 else 'lineno'
+        )
+        if self.before is None:
+            stats = [
+                (stat.traceback, stat.size, stat.count)
+                for stat in snapshot.statistics(key_type)
+            ]
+        else:
+            stats = [
+                (stat.traceback, stat.size_diff, stat.count_diff)
+                for stat in snapshot.compare_to(self.before, key_type)
+            ]
+        stats.sort(key=lambda stat: stat[1], reverse=True)
+        return {
+            'peak_kb': round((peak - self.base) / 1024, 1),
+            'retained_kb': round((current - self.base) / 1024, 1),
+            'top': [
+                {
+                    'location': ' <- '.join(
+                        f'{frame.filename}:{frame.lineno}'
+                        for frame in reversed(traceback)
+                    ),
+                    'size_kb': round(size / 1024, 1),
+                    'count': count,
+                }
+                for traceback, size, count in stats[
+                    :settings.MEMORY_PROFILING_TOP
+                ]
+                if size > 0
+            ],
+        }
+
+
+def record_memory_sample(entry):
+    """Записывает замер в кольцевой буфер замеров памяти."""
+    cache.add(MEMORY_CURSOR_KEY, 0, None)
+    try:
+        position = cache.incr(MEMORY_CURSOR_KEY)
+    except ValueError:
+        cache.set(MEMORY_CURSOR_KEY, 1, None)
+        position = 1
+    cache.set(
+        MEMORY_SLOT_KEY.format(
+            position % settings.MEMORY_PROFILING_LOG_SIZE
+        ),
+        {'time': time.time(), **entry},
+        None
+    )
+
+
+def get_memory_samples():
+    """Замеры из буфера, от новых к старым."""
+    entries = cache.get_many([
+        MEMORY_SLOT_KEY.format(slot)
+        for slot in range(settings.MEMORY_PROFILING_LOG_SIZE)
+    ]).values()
+    return sorted(entries, key=lambda entry: entry['time'], reverse=True)
+
+
+def clear_memory_samples():
+    cache.delete_many([MEMORY_CURSOR_KEY] + [
+        MEMORY_SLOT_KEY.format(slot)
+        for slot in range(settings.MEMORY_PROFILING_LOG_SIZE)
+    ])
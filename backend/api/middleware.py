@@ -0,0 +1,280 @@
+import asyncio
+import cProfile
+import gzip
+import json
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_sequence
+
+from recipes.models import User
+
+from .memory import MemorySampler, get_rss_kb, record_memory_sample
+from .orm_pool import run_in_pool, use_execute_wrapper
+from .profiling import get_profile_token_user_id, save_profile
+from .slow_queries import SlowQueryRecorder
+from .timing import RequestTimer, use_timer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+timing_logger = logging.getLogger('api.timing')
+
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы в brotli или gzip в зависимости от Accept-Encoding.
+
+    Ответы короче COMPRESSION_MIN_SIZE байт отдаются без сжатия.
+    """
+
+    @staticmethod
+    def get_encoding(request, streaming):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (
+            brotli is not None
+            and not streaming
+            and re_accepts_brotli.search(accept_encoding)
+        ):
+            return 'br'
+        if re_accepts_gzip.search(accept_encoding):
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def compress(encoding, content):
+        if encoding == 'br':
+            return brotli.compress(
+                content,
+                quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        return gzip.compress(
+            content,
+            compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+            mtime=0
+        )
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.get_encoding(request, response.streaming)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            compressed_content = self.compress(encoding, response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class SyncAndAsyncMiddleware:
+    """Основа middleware, работающего и под WSGI, и под ASGI.
+
+    Под ASGI вызывается __acall__, поэтому асинхронные представления не
+    переключаются в общий поток синхронного кода.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.call(request)
+
+    def call(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class RequestTimingMiddleware(SyncAndAsyncMiddleware):
+    """Замеряет этапы обработки запроса и время работы с базой данных.
+
+    Результат отдается в заголовке Server-Timing (персоналу или всем при
+    SERVER_TIMING_HEADER) и пишется в лог одной строкой JSON для доли
+    запросов REQUEST_TIMING_LOG_SAMPLE_RATE.
+    """
+
+    def call(self, request):
+        if not settings.REQUEST_TIMING_ENABLED:
+            return self.get_response(request)
+        timer = RequestTimer()
+        with use_timer(timer), timer.phase('total'):
+            with connection.execute_wrapper(timer.execute_wrapper):
+                response = self.get_response(request)
+        timer.finish()
+        return self.process_timer(request, response, timer)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_TIMING_ENABLED:
+            return await self.get_response(request)
+        timer = RequestTimer()
+        with use_timer(timer), timer.phase('total'):
+            with use_execute_wrapper(timer.execute_wrapper):
+                response = await self.get_response(request)
+        await run_in_pool(timer.finish)
+        return self.process_timer(request, response, timer)
+
+    @staticmethod
+    def process_timer(request, response, timer):
+        user = getattr(request, 'user', None)
+        if settings.SERVER_TIMING_HEADER or (user and user.is_staff):
+            response['Server-Timing'] = timer.as_header()
+        if random.random() < settings.REQUEST_TIMING_LOG_SAMPLE_RATE:
+            resolver_match = getattr(request, 'resolver_match', None)
+            timing_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': resolver_match.view_name if resolver_match else None,
+                'status': response.status_code,
+                'user_id': user.pk if user else None,
+                **timer.as_dict(),
+            }))
+        return response
+
+
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Профилирует через cProfile часть запросов и запросы персонала.
+
+    Профилируется доля запросов PROFILING_SAMPLE_RATE, а также запросы с
+    заголовком X-Profile, подписанным для сотрудника командой
+    profiles token. Профили сохраняются в PROFILING_DIR. Под ASGI
+    запросы не профилируются: cProfile не видит потоки пула ORM.
+    """
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def should_profile(request):
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return True
+        token = request.headers.get('X-Profile')
+        if not token:
+            return False
+        user_id = get_profile_token_user_id(token)
+        return user_id is not None and User.objects.filter(
+            pk=user_id,
+            is_staff=True
+        ).exists()
+
+    def call(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = profiler.runcall(self.get_response, request)
+        duration = time.perf_counter() - start
+        resolver_match = getattr(request, 'resolver_match', None)
+        path = save_profile(
+            profiler,
+            resolver_match.view_name if resolver_match else None,
+            queries,
+            duration
+        )
+        response['X-Profile-Id'] = path.name
+        return response
+
+
+class MemoryProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Замеряет через tracemalloc память части запросов.
+
+    Для доли запросов MEMORY_PROFILING_SAMPLE_RATE сохраняются пиковое и
+    оставшееся после ответа выделение памяти, крупнейшие места выделения
+    и RSS процесса; просмотр - командой memory_profiles. Под ASGI
+    запросы не замеряются: выделения параллельных запросов смешиваются.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.requests = 0
+
+    def call(self, request):
+        self.requests += 1
+        if random.random() >= settings.MEMORY_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        sampler = MemorySampler()
+        try:
+            response = self.get_response(request)
+        finally:
+            sample = sampler.finish()
+        resolver_match = getattr(request, 'resolver_match', None)
+        record_memory_sample({
+            'view': resolver_match.view_name if resolver_match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'pid': os.getpid(),
+            'request_number': self.requests,
+            'rss_kb': get_rss_kb(),
+            **sample,
+        })
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class SlowQueryMiddleware(SyncAndAsyncMiddleware):
+    """Записывает запросы к БД дольше SLOW_QUERY_THRESHOLD_MS мс.
+
+    Для каждого сохраняются представление, нормализованный SQL и план
+    выполнения; просмотр - командой slow_queries.
+    """
+
+    def call(self, request):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            return self.get_response(request)
+        with connection.execute_wrapper(SlowQueryRecorder(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            return await self.get_response(request)
+        with use_execute_wrapper(SlowQueryRecorder(request)):
+            return await self.get_response(request)
@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+_execute_wrappers = contextvars.ContextVar('orm_execute_wrappers', default=())
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий для процесса пул потоков ORM размером ORM_POOL_SIZE.
+
+    У каждого потока свое соединение с базой данных, поэтому размер пула
+    ограничивает и число соединений процесса.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.ORM_POOL_SIZE,
+                thread_name_prefix='orm'
+            )
+    return _executor
+
+
+@contextmanager
+def use_execute_wrapper(wrapper):
+    """Устанавливает wrapper на соединения в потоках пула ORM.
+
+    connection.execute_wrapper действует только в текущем потоке;
+    обертки, заданные здесь, run_in_pool устанавливает перед вызовом.
+    """
+    token = _execute_wrappers.set(_execute_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _execute_wrappers.reset(token)
+
+
+def call_with_wrappers(func, *args, **kwargs):
+    """Вызывает func с обертками запросов, заданными use_execute_wrapper."""
+    with ExitStack() as stack:
+        for wrapper in _execute_wrappers.get():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        return func(*args, **kwargs)
+
+
+def call_in_pool_thread(func, *args, **kwargs):
+    try:
+        return call_with_wrappers(func, *args, **kwargs)
+    finally:
+        if connection.errors_occurred and not connection.is_usable():
+            connection.close()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Выполняет блокирующий func в пуле потоков ORM.
+
+    Вызов видит контекстные переменные запроса (таймер, обертки
+    запросов). Соединения потоков пула не закрываются после каждого
+    вызова, а переоткрываются только после ошибок.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(),
+        lambda: context.run(call_in_pool_thread, func, *args, **kwargs)
+    )
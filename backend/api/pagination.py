@@ -1,6 +1,109 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 
+from .cache import get_count_cache_key
+
+# параметры и действия, при которых выборка зависит от отметок пользователя
+USER_COUNT_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+USER_COUNT_ACTIONS = ('subscriptions',)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, кэширующий количество объектов для каждого набора фильтров.
+
+    На PostgreSQL для больших выборок вместо точного COUNT(*) используется
+    оценка планировщика. Количества выборок, зависящих от отметок
+    пользователя user_id, сбрасываются отдельно для каждого пользователя.
+    """
+
+    def __init__(self, *args, user_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_id = user_id
+
+    @staticmethod
+    def get_estimated_count(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        key = get_count_cache_key(self.object_list, self.user_id)
+        count = cache.get(key)
+        if count is None:
+            count = self.get_estimated_count(self.object_list)
+            if (
+                count is None
+                or count < settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+            ):
+                count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
 
 class PageNumberLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+    @staticmethod
+    def get_count_user_id(request, view):
+        """Id пользователя, от отметок которого зависит количество."""
+        if not request.user.is_authenticated:
+            return None
+        if getattr(view, 'action', None) in USER_COUNT_ACTIONS or any(
+            request.query_params.get(param) for param in USER_COUNT_PARAMS
+        ):
+            return request.user.pk
+        return None
+
+    def django_paginator_class(self, object_list, per_page):
+        return CachedCountPaginator(
+            object_list,
+            per_page,
+            user_id=self.count_user_id
+        )
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Как paginate_queryset, но возвращает невычисленную выборку.
+
+        Выборку страницы можно дополнить аннотациями и получить одним
+        запросом. None, если пагинация для запроса не нужна.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.count_user_id = self.get_count_user_id(request, view)
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number,
+                message=str(exc)
+            ))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return self.page.object_list
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request, view)
+        return None if page is None else list(page)
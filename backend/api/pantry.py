@@ -0,0 +1,218 @@
+import heapq
+import logging
+import threading
+from array import array
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import IngredientRecipe, Recipe, RecipeChange
+
+logger = logging.getLogger(__name__)
+
+# после стольких измененных рецептов индекс перестраивается в фоне
+PANTRY_OVERLAY_LIMIT = 10000
+
+
+def get_settled_change_id():
+    """Id последнего изменения рецептов, все предыдущие которого видны.
+
+    id изменений выдаются до фиксации транзакций, поэтому изменения моложе
+    RECIPE_CHANGES_DELAY не учитываются, как и в ленте изменений.
+    """
+    changes = RecipeChange.objects.all()
+    first_recent_id = RecipeChange.objects.filter(
+        changed_at__gt=timezone.now() - timedelta(
+            seconds=settings.RECIPE_CHANGES_DELAY
+        )
+    ).order_by('id').values_list('id', flat=True).first()
+    if first_recent_id is not None:
+        changes = changes.filter(id__lt=first_recent_id)
+    return changes.aggregate(change_id=Max('id'))['change_id'] or 0
+
+
+def get_match_order(match):
+    recipe_id, coverage, missing = match
+    return -coverage, missing, -recipe_id
+
+
+class PantryMatches:
+    """Подобранные рецепты, упорядоченные по get_match_order.
+
+    Сортируются только первые элементы, запрошенные срезом страницы.
+    """
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        stop = len(self) if index.stop is None else index.stop
+        return heapq.nsmallest(stop, self.matches, key=get_match_order)[index]
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент -> отсортированные id рецептов.
+
+    Подбор рецептов по имеющимся ингредиентам суммирует вхождения рецептов
+    в списки выбранных ингредиентов, не обращаясь к базе данных. Рецепты,
+    измененные после построения, хранятся отдельно в changed и
+    обновляются по журналу изменений рецептов.
+    """
+
+    def __init__(self):
+        self.change_id = get_settled_change_id()
+        self.changed = {}
+        postings = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id').iterator(chunk_size=10000):
+            postings[ingredient_id].append(recipe_id)
+        self.postings = {
+            ingredient_id: array('q', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.ingredients_count = Counter()
+        for recipe_ids in self.postings.values():
+            self.ingredients_count.update(recipe_ids)
+        self.recipe_tags = defaultdict(set)
+        for recipe_id, slug in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__slug'
+        ).iterator(chunk_size=10000):
+            self.recipe_tags[recipe_id].add(slug)
+
+    def get_changed_recipe_ids(self, change_id):
+        return set(RecipeChange.objects.filter(
+            id__gt=self.change_id,
+            id__lte=change_id
+        ).values_list('recipe_id', flat=True))
+
+    def apply_changes(self, change_id, recipe_ids):
+        """Перечитывает рецепты recipe_ids, измененные до change_id.
+
+        Удаленные рецепты и рецепты без ингредиентов отмечаются None.
+        """
+        ingredients = defaultdict(set)
+        tags = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('recipe_id', 'tag__slug'):
+            tags[recipe_id].add(slug)
+        changed = dict(self.changed)
+        for recipe_id in recipe_ids:
+            changed[recipe_id] = (
+                (frozenset(ingredients[recipe_id]), tags[recipe_id])
+                if recipe_id in ingredients else None
+            )
+        self.changed = changed
+        self.change_id = change_id
+
+    def match(self, ingredient_ids, max_missing=None, tags=None):
+        """Подбирает рецепты в порядке убывания доли имеющихся ингредиентов.
+
+        Возвращает PantryMatches из кортежей (id рецепта, доля, число
+        недостающих).
+        """
+        selected = set(ingredient_ids)
+        tags = set(tags or ())
+        changed = self.changed
+        matches = []
+
+        def add_match(recipe_id, owned, total, recipe_tags):
+            missing = total - owned
+            if max_missing is not None and missing > max_missing:
+                return
+            if tags and not tags & recipe_tags:
+                return
+            matches.append((recipe_id, owned / total, missing))
+
+        hits = Counter()
+        for ingredient_id in selected:
+            hits.update(self.postings.get(ingredient_id, ()))
+        for recipe_id, owned in hits.items():
+            if recipe_id not in changed:
+                add_match(
+                    recipe_id,
+                    owned,
+                    self.ingredients_count[recipe_id],
+                    self.recipe_tags[recipe_id]
+                )
+        for recipe_id, item in changed.items():
+            if item is None:
+                continue
+            recipe_ingredients, recipe_tags = item
+            owned = len(recipe_ingredients & selected)
+            if owned:
+                add_match(
+                    recipe_id,
+                    owned,
+                    len(recipe_ingredients),
+                    recipe_tags
+                )
+        return PantryMatches(matches)
+
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+
+
+def rebuild_pantry_index():
+    """Перестраивает индекс процесса в фоновом потоке.
+
+    До окончания перестройки запросы обслуживает прежний индекс.
+    """
+    global _rebuilding
+    with _index_lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+
+    def rebuild():
+        global _index, _rebuilding
+        try:
+            index = PantryIndex()
+            with _index_lock:
+                _index = index
+        except Exception:
+            logger.exception('Ошибка перестройки индекса кладовой')
+        finally:
+            _rebuilding = False
+            connection.close()
+
+    threading.Thread(target=rebuild, name='pantry-index', daemon=True).start()
+
+
+def get_pantry_index():
+    """Возвращает индекс процесса с примененными изменениями рецептов.
+
+    Индекс строится при прогреве процесса; в запросах к нему применяются
+    только новые записи журнала изменений. Если их больше
+    PANTRY_OVERLAY_LIMIT, индекс перестраивается в фоне.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PantryIndex()
+        index = _index
+        change_id = get_settled_change_id()
+        if change_id <= index.change_id:
+            return index
+        recipe_ids = index.get_changed_recipe_ids(change_id)
+        if len(index.changed) + len(recipe_ids) <= PANTRY_OVERLAY_LIMIT:
+            index.apply_changes(change_id, recipe_ids)
+            return index
+    rebuild_pantry_index()
+    return index
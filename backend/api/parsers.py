@@ -0,0 +1,27 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson с откатом на стандартный модуль json."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get(
+            'encoding',
+            settings.DEFAULT_CHARSET
+        )
+        if (
+            orjson is None
+            or settings.JSON_ENGINE != 'orjson'
+            or encoding.lower() not in ('utf-8', 'utf8')
+        ):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,56 @@
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+PROFILE_TOKEN_SALT = 'api.profiling'
+PROFILE_FILENAME_RE = re.compile(
+    r'^(?P<timestamp>\d+)_(?P<view>[\w-]+)_(?P<queries>\d+)q_'
+    r'(?P<duration>\d+)ms\.prof$'
+)
+
+
+def make_profile_token(user):
+    """Подписанное значение заголовка X-Profile для сотрудника."""
+    return signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).sign(str(user.pk))
+
+
+def get_profile_token_user_id(token):
+    try:
+        return int(signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).unsign(
+            token,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE
+        ))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def get_profile_dir():
+    profile_dir = Path(settings.PROFILING_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    return profile_dir
+
+
+def get_profile_files(view_name=None):
+    """Файлы профилей, от новых к старым."""
+    profile_files = []
+    for path in get_profile_dir().glob('*.prof'):
+        match = PROFILE_FILENAME_RE.match(path.name)
+        if match and (view_name is None or match['view'] == view_name):
+            profile_files.append((path, match.groupdict()))
+    return sorted(profile_files, key=lambda item: item[0].name, reverse=True)
+
+
+def save_profile(profiler, view_name, queries, duration):
+    """Сохраняет профиль и удаляет самые старые сверх PROFILING_MAX_FILES."""
+    view_name = re.sub(r'[^\w-]', '_', view_name or 'unknown')
+    path = get_profile_dir() / (
+        f'{time.time_ns()}_{view_name}_{queries}q_'
+        f'{round(duration * 1000)}ms.prof'
+    )
+    profiler.dump_stats(path)
+    for old_path, _ in get_profile_files()[settings.PROFILING_MAX_FILES:]:
+        old_path.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,68 @@
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal, receiver
+from rest_framework.permissions import SAFE_METHODS
+
+from .tasks import enqueue
+
+purge_requested = Signal()
+
+
+def purge_surrogate_keys(*keys):
+    """Просит шлюз удалить из кэша ответы с указанными ключами.
+
+    Запрос отправляется после фиксации текущей транзакции.
+    """
+    if keys:
+        transaction.on_commit(
+            lambda: purge_requested.send(sender=None, keys=set(keys))
+        )
+
+
+def send_purge_request(keys):
+    request = urllib.request.Request(
+        settings.GATEWAY_PURGE_URL,
+        method='PURGE',
+        headers={'Surrogate-Key': ' '.join(sorted(keys))}
+    )
+    urllib.request.urlopen(
+        request,
+        timeout=settings.GATEWAY_PURGE_TIMEOUT
+    ).close()
+
+
+class SurrogateKeyMixin:
+    """Помечает ответы на безопасные запросы заголовком Surrogate-Key.
+
+    По этим ключам шлюз удаляет закэшированные ответы.
+    """
+
+    surrogate_key = None
+
+    def get_surrogate_keys(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            return (
+                self.surrogate_key,
+                f'{self.surrogate_key}-{self.kwargs[lookup_url_kwarg]}'
+            )
+        return (self.surrogate_key, f'{self.surrogate_key}-list')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs
+        )
+        if self.surrogate_key and request.method in SAFE_METHODS:
+            response['Surrogate-Key'] = ' '.join(self.get_surrogate_keys())
+        return response
+
+
+@receiver(purge_requested)
+def enqueue_purge_request(sender, keys, **kwargs):
+    if settings.GATEWAY_PURGE_URL:
+        enqueue(send_purge_request, sorted(keys))
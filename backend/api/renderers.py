@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с откатом на стандартный модуль json."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or settings.JSON_ENGINE != 'orjson'
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(
+            data,
+            default=encoders.JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+        # Как и JSONRenderer, экранируем U+2028 и U+2029.
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
@@ -1,9 +1,15 @@
+from django.db import models
 from drf_extra_fields.fields import Base64ImageField
-from rest_framework import serializers, validators
+from rest_framework import serializers
 
 import recipes.constants
-from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCart, Tag, User)
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag, User
+
+from .cache import get_cached_recipe_data, invalidate_recipe_cache
+from .purge import purge_surrogate_keys
+from .similarity import update_similar_recipes
+from .tasks import enqueue
+from .timing import TimedSerializerMixin
 
 
 class NotNullBase64ImageField(Base64ImageField):
@@ -15,11 +21,43 @@ class NotNullBase64ImageField(Base64ImageField):
         return super().to_internal_value(data)
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_requested_fields(request, fields):
+    """Возвращает поля, оставшиеся после параметров fields/omit запроса."""
+    requested = set(fields)
+    if request is None:
+        return requested
+    only = request.query_params.get('fields')
+    if only:
+        requested &= {name.strip() for name in only.split(',')}
+    omit = request.query_params.get('omit')
+    if omit:
+        requested -= {name.strip() for name in omit.split(',')}
+    return requested
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля, запрошенные через fields/omit."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(
+            self.context.get('request'),
+            self.fields
+        )
+        for name in set(self.fields) - requested:
+            self.fields.pop(name)
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'username',
@@ -68,26 +106,26 @@ class IngredientRecipeShortSerializer(serializers.Serializer):
     )
 
 
-class IngredientRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField(read_only=True, source='ingredient.id')
-    name = serializers.CharField(read_only=True, source='ingredient.name')
-    measurement_unit = serializers.CharField(
-        read_only=True,
-        source='ingredient.measurement_unit'
-    )
+class IngredientsDataField(serializers.JSONField):
+    """Ингредиенты из Recipe.ingredients_data в порядке ключей API.
 
-    class Meta:
-        model = IngredientRecipe
-        fields = ('id', 'name', 'measurement_unit', 'amount')
+    jsonb в PostgreSQL не сохраняет порядок ключей объектов.
+    """
+
+    keys = ('id', 'name', 'measurement_unit', 'amount')
 
+    def to_representation(self, value):
+        return [{key: item[key] for key in self.keys} for item in value]
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+
+class RecipeGetSerializer(TimedSerializerMixin, SparseFieldsMixin,
+                          serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, required=True)
     image = NotNullBase64ImageField(required=True)
-    ingredients = IngredientRecipeSerializer(
-        source='ingredient_in_recipe',
-        many=True
+    ingredients = IngredientsDataField(
+        source='ingredients_data',
+        read_only=True
     )
     is_favorited = serializers.BooleanField(default=False)
     is_in_shopping_cart = serializers.BooleanField(default=False)
@@ -109,6 +147,73 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         model = Recipe
 
 
+class CachedRecipeListSerializer(TimedSerializerMixin,
+                                 serializers.ListSerializer):
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_cached_representation(list(iterable))
+
+
+class CachedRecipeGetSerializer(RecipeGetSerializer):
+    """RecipeGetSerializer, берущий общую часть представления из кэша.
+
+    Поля, зависящие от пользователя, подставляются при каждом ответе;
+    id авторов, на которых подписан пользователь, можно передать в
+    контексте subscribed_authors.
+    """
+
+    class Meta(RecipeGetSerializer.Meta):
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.to_cached_representation([instance])[0]
+
+    def to_cached_representation(self, recipes):
+        request = self.context.get('request')
+        subscribed_authors = self.context.get('subscribed_authors', set())
+        if (
+            'subscribed_authors' not in self.context
+            and 'author' in self.fields
+            and request
+            and request.user.is_authenticated
+        ):
+            subscribed_authors = set(
+                request.user.follow_followed_to.filter(
+                    author__in={recipe.author_id for recipe in recipes}
+                ).values_list('author_id', flat=True)
+            )
+        representation = []
+        for recipe, cached_data in zip(
+            recipes,
+            get_cached_recipe_data(recipes, RecipeGetSerializer)
+        ):
+            if cached_data is None:
+                continue
+            data = {name: cached_data[name] for name in self.fields}
+            if 'author' in data:
+                data['author'] = {
+                    **data['author'],
+                    'is_subscribed': (
+                        request
+                        and request.user.is_authenticated
+                        and recipe.author_id in subscribed_authors
+                    )
+                }
+            if 'image' in data and data['image'] and request:
+                data['image'] = request.build_absolute_uri(data['image'])
+            if 'is_favorited' in data:
+                data['is_favorited'] = bool(
+                    getattr(recipe, 'is_favorited', False)
+                )
+            if 'is_in_shopping_cart' in data:
+                data['is_in_shopping_cart'] = bool(
+                    getattr(recipe, 'is_in_shopping_cart', False)
+                )
+            representation.append(data)
+        return representation
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(
         read_only=True,
@@ -178,6 +283,18 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient in ingredients
         ]
         IngredientRecipe.objects.bulk_create(ingredients_to_add)
+        recipe.sync_ingredients_data([
+            {
+                'id': ingredient['id'].pk,
+                'name': ingredient['id'].name,
+                'measurement_unit': ingredient['id'].measurement_unit,
+                'amount': ingredient['amount'],
+            }
+            for ingredient in ingredients
+        ])
+        invalidate_recipe_cache(recipe.pk)
+        purge_surrogate_keys('recipes-list', f'recipes-{recipe.pk}')
+        enqueue(update_similar_recipes, recipe.pk)
 
     def create(self, validated_data):
         tags = validated_data.pop('tags')
@@ -202,7 +319,21 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
     def to_representation(self, obj):
-        return RecipeGetSerializer(obj, context=self.context).data
+        return CachedRecipeGetSerializer(obj, context=self.context).data
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(
+            min_value=recipes.constants.MIN_POSITIVE_INTEGER
+        ),
+        allow_empty=False
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+    tags = serializers.ListField(
+        child=serializers.SlugField(),
+        required=False
+    )
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
@@ -246,62 +377,3 @@ class UserRecipesSerializer(UserSerializer):
             context=self.context,
             many=True
         ).data
-
-
-class UserRecipeBaseSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        fields = ('recipe', 'user')
-
-    def to_representation(self, instance):
-        return RecipeShortSerializer(instance.recipe).data
-
-    def validate(self, attrs):
-        if self.Meta.model.objects.filter(
-            user=attrs['user'],
-            recipe=attrs['recipe']
-        ).exists():
-            raise serializers.ValidationError(
-                {'errors': ('Связь между пользователем и рецептом '
-                            f'{str(attrs["recipe"])} уже существует.')}
-            )
-        return super().validate(attrs)
-
-
-class FavoriteSerializer(UserRecipeBaseSerializer):
-
-    class Meta(UserRecipeBaseSerializer.Meta):
-        model = Favorite
-
-
-class ShoppingCartSerializer(UserRecipeBaseSerializer):
-
-    class Meta(UserRecipeBaseSerializer.Meta):
-        model = ShoppingCart
-
-
-class FollowSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        fields = ('author', 'user')
-        model = Follow
-
-        validators = (
-            validators.UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author')
-            ),
-        )
-
-    def validate_author(self, value):
-        if value == self.context['request'].user:
-            raise serializers.ValidationError(
-                {'author': 'Пользователь не может подписаться на себя самого!'}
-            )
-        return value
-
-    def to_representation(self, instance):
-        return UserRecipesSerializer(
-            instance.author,
-            context=self.context
-        ).data
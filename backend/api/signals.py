@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.models import (Follow, Ingredient, IngredientRecipe, Recipe,
+                            SimilarRecipe, Tag, User)
+
+from .cache import invalidate_count_cache, invalidate_recipe_cache
+from .purge import purge_surrogate_keys
+from .similarity import invalidate_similar_cache
+from .suggestions import remove_suggested_author, update_suggested_authors
+from .tasks import enqueue
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe_cache(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Сбрасывает кэш списков похожих, из которых удаляется рецепт."""
+    recipe_ids = [instance.pk, *SimilarRecipe.objects.filter(
+        similar_id=instance.pk
+    ).values_list('recipe_id', flat=True)]
+    transaction.on_commit(lambda: invalidate_similar_cache(*recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate_recipe_cache(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=IngredientRecipe)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipe_cache(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_recipe_cache(
+            *instance.recipes.values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipe_cache(*pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def catalogue_item_changed(sender, instance, **kwargs):
+    invalidate_recipe_cache(
+        *instance.recipes.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_recipe_cache(
+        *instance.recipes.values_list('pk', flat=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=User)
+def paginated_object_changed(sender, created=True, **kwargs):
+    if created:
+        invalidate_count_cache()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_count_cache()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def purge_recipe(sender, instance, **kwargs):
+    purge_surrogate_keys('recipes-list', f'recipes-{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def purge_recipe_ingredient(sender, instance, **kwargs):
+    purge_surrogate_keys('recipes-list', f'recipes-{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=IngredientRecipe)
+def purge_recipe_relations(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        purge_surrogate_keys('recipes')
+    else:
+        purge_surrogate_keys('recipes-list', f'recipes-{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def purge_tag(sender, instance, **kwargs):
+    purge_surrogate_keys('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def purge_ingredient(sender, instance, **kwargs):
+    purge_surrogate_keys('ingredients', 'recipes')
+
+
+@receiver(post_save, sender=User)
+def purge_author(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    purge_surrogate_keys('recipes')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        remove_suggested_author(instance.user_id, instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    enqueue(update_suggested_authors, instance.user_id)
@@ -0,0 +1,286 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Min
+
+from recipes.models import IngredientRecipe, Recipe, SimilarRecipe
+
+SIMILAR_RECIPES_LIMIT = 20
+CANDIDATES_LIMIT = 200
+# ингредиент в большей доле каталога не учитывается при поиске кандидатов;
+# порог ограничен сверху, чтобы работа на рецепт не росла с каталогом
+COMMON_INGREDIENT_SHARE = 0.05
+MIN_INGREDIENT_RECIPES = 100
+MAX_INGREDIENT_RECIPES = 1000
+TAG_WEIGHT = 0.25
+SIMILAR_RECIPES_CACHE_KEY = 'recipe:similar:v1:{}'
+
+
+def get_similarity_score(ingredients, tags, other_ingredients, other_tags):
+    """Сходство двух рецептов: мера Жаккара по ингредиентам и тегам."""
+    score = (
+        len(ingredients & other_ingredients)
+        / (len(ingredients | other_ingredients) or 1)
+    )
+    score += TAG_WEIGHT * (
+        len(tags & other_tags) / (len(tags | other_tags) or 1)
+    )
+    return score
+
+
+def get_top_similar(recipe_id, ingredients, tags, candidates,
+                    recipe_ingredients, recipe_tags):
+    scores = (
+        (
+            get_similarity_score(
+                ingredients,
+                tags,
+                recipe_ingredients[candidate_id],
+                recipe_tags[candidate_id]
+            ),
+            candidate_id
+        )
+        for candidate_id in candidates
+        if candidate_id != recipe_id
+    )
+    return sorted(scores, reverse=True)[:SIMILAR_RECIPES_LIMIT]
+
+
+def get_recipe_sets(recipe_ids):
+    """Множества ингредиентов и тегов рецептов.
+
+    Id запрашиваются частями, чтобы не превысить предел параметров
+    запроса базы данных.
+    """
+    recipe_ids = list(recipe_ids)
+    chunk_size = (
+        connection.features.max_query_params or max(len(recipe_ids), 1)
+    )
+    recipe_ingredients = defaultdict(set)
+    recipe_tags = defaultdict(set)
+    for start in range(0, len(recipe_ids), chunk_size):
+        chunk = recipe_ids[start:start + chunk_size]
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe__in=chunk
+        ).values_list('recipe_id', 'ingredient_id'):
+            recipe_ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe__in=chunk
+        ).values_list('recipe_id', 'tag_id'):
+            recipe_tags[recipe_id].add(tag_id)
+    return recipe_ingredients, recipe_tags
+
+
+def get_common_ingredient_limit():
+    """Наибольшее число рецептов с ингредиентом, учитываемым в кандидатах.
+
+    COMMON_INGREDIENT_SHARE рецептов каталога, но не меньше
+    MIN_INGREDIENT_RECIPES и не больше MAX_INGREDIENT_RECIPES.
+    """
+    return min(
+        MAX_INGREDIENT_RECIPES,
+        max(
+            MIN_INGREDIENT_RECIPES,
+            int(Recipe.objects.count() * COMMON_INGREDIENT_SHARE)
+        )
+    )
+
+
+def get_common_ingredient_ids(recipe_ids=None):
+    """Ингредиенты, входящие в рецепты чаще get_common_ingredient_limit.
+
+    При recipe_ids проверяются только ингредиенты этих рецептов.
+    """
+    postings = IngredientRecipe.objects.all()
+    if recipe_ids is not None:
+        postings = postings.filter(
+            ingredient__in=IngredientRecipe.objects.filter(
+                recipe__in=recipe_ids
+            ).values('ingredient_id')
+        )
+    return set(postings.order_by().values('ingredient_id').annotate(
+        recipes_count=Count('id')
+    ).filter(
+        recipes_count__gt=get_common_ingredient_limit()
+    ).values_list('ingredient_id', flat=True))
+
+
+def get_candidates(recipe_ids, common_ingredient_ids):
+    """Кандидаты в похожие для рецептов.
+
+    Для каждого рецепта - до CANDIDATES_LIMIT рецептов с наибольшим
+    числом общих ингредиентов, без учета частых ингредиентов
+    common_ingredient_ids. Общие ингредиенты пар считаются в базе данных.
+    """
+    candidates = defaultdict(list)
+    for recipe_id, candidate_id in IngredientRecipe.objects.filter(
+        recipe__in=recipe_ids
+    ).exclude(
+        ingredient__in=common_ingredient_ids
+    ).values('recipe_id', 'ingredient__recipes__id').annotate(
+        shared=Count('id')
+    ).order_by(
+        'recipe_id',
+        '-shared',
+        'ingredient__recipes__id'
+    ).values_list('recipe_id', 'ingredient__recipes__id').iterator():
+        if candidate_id != recipe_id and (
+            len(candidates[recipe_id]) < CANDIDATES_LIMIT
+        ):
+            candidates[recipe_id].append(candidate_id)
+    return candidates
+
+
+def invalidate_similar_cache(*recipe_ids):
+    if recipe_ids:
+        cache.delete_many([
+            SIMILAR_RECIPES_CACHE_KEY.format(recipe_id)
+            for recipe_id in recipe_ids
+        ])
+
+
+def get_similar_recipe_ids(recipe_id):
+    """Id похожих рецептов в порядке убывания сходства (с кэшем)."""
+    key = SIMILAR_RECIPES_CACHE_KEY.format(recipe_id)
+    similar_ids = cache.get(key)
+    if similar_ids is None:
+        similar_ids = list(SimilarRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).order_by('-score').values_list('similar_id', flat=True))
+        cache.set(key, similar_ids, None)
+    return similar_ids
+
+
+@transaction.atomic
+def update_similar_recipes(recipe_id):
+    """Пересчитывает похожие рецепты для одного рецепта.
+
+    В списках других рецептов, где он уже есть, обновляется только его
+    оценка; в списки кандидатов из его первых SIMILAR_RECIPES_LIMIT он
+    добавляется, если проходит в их первые SIMILAR_RECIPES_LIMIT. Полная
+    перестройка индекса выполняется командой build_similar_recipes.
+    """
+    candidates = get_candidates(
+        [recipe_id],
+        get_common_ingredient_ids([recipe_id])
+    )[recipe_id]
+    entries = list(SimilarRecipe.objects.filter(similar_id=recipe_id))
+    recipe_ingredients, recipe_tags = get_recipe_sets(
+        set(candidates) | {entry.recipe_id for entry in entries} | {recipe_id}
+    )
+    top_similar = get_top_similar(
+        recipe_id,
+        recipe_ingredients[recipe_id],
+        recipe_tags[recipe_id],
+        candidates,
+        recipe_ingredients,
+        recipe_tags
+    )
+    SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for score, similar_id in top_similar
+    )
+
+    touched_ids = [recipe_id]
+    for entry in entries:
+        entry.score = get_similarity_score(
+            recipe_ingredients[recipe_id],
+            recipe_tags[recipe_id],
+            recipe_ingredients[entry.recipe_id],
+            recipe_tags[entry.recipe_id]
+        )
+        touched_ids.append(entry.recipe_id)
+    SimilarRecipe.objects.bulk_update(entries, ('score',), batch_size=1000)
+    listed_ids = {entry.recipe_id for entry in entries}
+    top_similar = [
+        (score, candidate_id)
+        for score, candidate_id in top_similar
+        if candidate_id not in listed_ids
+    ]
+    candidate_lists = {
+        row['recipe_id']: row
+        for row in SimilarRecipe.objects.filter(
+            recipe__in=[candidate_id for _, candidate_id in top_similar]
+        ).values('recipe_id').annotate(
+            min_score=Min('score'),
+            similar_count=Count('id')
+        )
+    }
+    for score, candidate_id in top_similar:
+        candidate_list = candidate_lists.get(candidate_id)
+        if candidate_list is not None and (
+            candidate_list['similar_count'] >= SIMILAR_RECIPES_LIMIT
+        ):
+            if score <= candidate_list['min_score']:
+                continue
+            SimilarRecipe.objects.filter(
+                pk__in=SimilarRecipe.objects.filter(
+                    recipe_id=candidate_id
+                ).order_by('score').values('pk')[:1]
+            ).delete()
+        SimilarRecipe.objects.create(
+            recipe_id=candidate_id,
+            similar_id=recipe_id,
+            score=score
+        )
+        touched_ids.append(candidate_id)
+    transaction.on_commit(lambda: invalidate_similar_cache(*touched_ids))
+
+
+@transaction.atomic
+def build_similar_batch(recipe_ids, common_ingredient_ids):
+    """Пересчитывает списки похожих рецептов для пачки рецептов."""
+    candidates = get_candidates(recipe_ids, common_ingredient_ids)
+    recipe_ingredients, recipe_tags = get_recipe_sets(
+        {
+            candidate_id
+            for candidate_ids in candidates.values()
+            for candidate_id in candidate_ids
+        } | set(recipe_ids)
+    )
+    SimilarRecipe.objects.filter(recipe__in=recipe_ids).delete()
+    SimilarRecipe.objects.bulk_create(
+        (
+            SimilarRecipe(
+                recipe_id=recipe_id,
+                similar_id=similar_id,
+                score=score
+            )
+            for recipe_id in recipe_ids
+            for score, similar_id in get_top_similar(
+                recipe_id,
+                recipe_ingredients[recipe_id],
+                recipe_tags[recipe_id],
+                candidates[recipe_id],
+                recipe_ingredients,
+                recipe_tags
+            )
+        ),
+        batch_size=1000
+    )
+    transaction.on_commit(lambda: invalidate_similar_cache(*recipe_ids))
+
+
+def build_similar_recipes(batch_size=500):
+    """Полностью перестраивает таблицу похожих рецептов.
+
+    Рецепты обрабатываются пачками по возрастанию id, каждая в своей
+    транзакции: в памяти находятся только множества ингредиентов и тегов
+    рецептов пачки и их кандидатов, а старые списки доступны до замены.
+    Частые ингредиенты (get_common_ingredient_limit) при поиске
+    кандидатов не учитываются.
+    """
+    common_ingredient_ids = get_common_ingredient_ids()
+    after_id = 0
+    recipes_count = 0
+    while True:
+        recipe_ids = list(Recipe.objects.filter(pk__gt=after_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:batch_size])
+        if not recipe_ids:
+            return recipes_count
+        build_similar_batch(recipe_ids, common_ingredient_ids)
+        recipes_count += len(recipe_ids)
+        after_id = recipe_ids[-1]
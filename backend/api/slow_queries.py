@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+
+SLOW_QUERY_CURSOR_KEY = 'slow_queries:cursor'
+SLOW_QUERY_SLOT_KEY = 'slow_queries:{}'
+
+logger = logging.getLogger('api.slow_queries')
+
+re_string = re.compile(r"'(?:[^']|'')*'")
+re_number = re.compile(r'\b\d+(?:\.\d+)?\b')
+re_placeholder_list = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+re_whitespace = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL без литералов: одинаковые по форме запросы совпадают."""
+    sql = re_string.sub('?', sql)
+    sql = re_number.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re_placeholder_list.sub('(...)', sql)
+    return re_whitespace.sub(' ', sql).strip()
+
+
+def get_fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def explain(sql, params):
+    """План запроса; на PostgreSQL с ANALYZE при SLOW_QUERY_EXPLAIN_ANALYZE."""
+    options = {}
+    if (
+        connection.vendor == 'postgresql'
+        and settings.SLOW_QUERY_EXPLAIN_ANALYZE
+    ):
+        options['analyze'] = True
+    try:
+        # точка сохранения: ошибка EXPLAIN не прерывает транзакцию запроса
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix(**options)} {sql}',
+                params
+            )
+            return '\n'.join(
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+    except DatabaseError as error:
+        return f'EXPLAIN не выполнен: {error}'
+
+
+def record_slow_query(entry):
+    """Записывает запрос в кольцевой буфер из SLOW_QUERY_LOG_SIZE ячеек."""
+    cache.add(SLOW_QUERY_CURSOR_KEY, 0, None)
+    try:
+        position = cache.incr(SLOW_QUERY_CURSOR_KEY)
+    except ValueError:
+        cache.set(SLOW_QUERY_CURSOR_KEY, 1, None)
+        position = 1
+    cache.set(
+        SLOW_QUERY_SLOT_KEY.format(position % settings.SLOW_QUERY_LOG_SIZE),
+        entry,
+        None
+    )
+
+
+def get_slow_queries():
+    """Записи буфера, от новых к старым."""
+    entries = cache.get_many([
+        SLOW_QUERY_SLOT_KEY.format(slot)
+        for slot in range(settings.SLOW_QUERY_LOG_SIZE)
+    ]).values()
+    return sorted(entries, key=lambda entry: entry['time'], reverse=True)
+
+
+def clear_slow_queries():
+    cache.delete_many([SLOW_QUERY_CURSOR_KEY] + [
+        SLOW_QUERY_SLOT_KEY.format(slot)
+        for slot in range(settings.SLOW_QUERY_LOG_SIZE)
+    ])
+
+
+class SlowQueryRecorder:
+    """Обертка execute_wrapper, записывающая медленные запросы с планом.
+
+    Планы снимаются только для SELECT, чтобы EXPLAIN ANALYZE не повторял
+    изменения данных.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.explaining = set()
+
+    def get_view_name(self):
+        resolver_match = getattr(self.request, 'resolver_match', None)
+        return resolver_match.view_name if resolver_match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        if threading.get_ident() in self.explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self.record(sql, params, many, duration)
+
+    def record(self, sql, params, many, duration):
+        normalized_sql = normalize_sql(sql)
+        plan = None
+        if (
+            not many
+            and sql.lstrip()[:6].upper() == 'SELECT'
+            and not connection.needs_rollback
+        ):
+            self.explaining.add(threading.get_ident())
+            try:
+                plan = explain(sql, params)
+            finally:
+                self.explaining.discard(threading.get_ident())
+        entry = {
+            'time': time.time(),
+            'duration_ms': round(duration, 2),
+            'view': self.get_view_name(),
+            'method': self.request.method,
+            'path': self.request.path,
+            'fingerprint': get_fingerprint(normalized_sql),
+            'sql': normalized_sql,
+            'explain': plan,
+        }
+        logger.warning(
+            'Медленный запрос %s (%s мс) в %s',
+            entry['fingerprint'],
+            entry['duration_ms'],
+            entry['view']
+        )
+        record_slow_query(entry)
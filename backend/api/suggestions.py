@@ -0,0 +1,175 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import Favorite, Follow, SuggestedAuthor, User
+
+from .tasks import enqueue_periodic
+
+SUGGESTED_AUTHORS_LIMIT = 50
+MAX_FOLLOWS = 500
+MAX_FRIEND_FOLLOWS = 200
+FAVORITE_WEIGHT = 0.5
+SUGGESTED_AUTHORS_CACHE_KEY = 'user:suggested_authors:v1:{}'
+
+
+def get_follows(user_ids, limit=None):
+    """Авторы, на которых подписаны пользователи, от новых подписок.
+
+    При limit для каждого пользователя из базы читаются только limit
+    последних подписок.
+    """
+    follows = Follow.objects.filter(user__in=user_ids)
+    if limit is None:
+        rows = follows.order_by('user_id', '-pk').values_list(
+            'user_id',
+            'author_id'
+        )
+    else:
+        # Django 3.2 не фильтрует по оконным функциям, поэтому номер
+        # подписки ограничивается во внешнем запросе
+        sql, params = follows.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('user_id'),
+                order_by=F('pk').desc()
+            )
+        ).order_by().values_list(
+            'user_id',
+            'author_id',
+            'position'
+        ).query.sql_with_params()
+        position = connection.ops.quote_name('position')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT user_id, author_id FROM ({sql}) AS follows '
+                f'WHERE {position} <= %s ORDER BY user_id, {position}',
+                (*params, limit)
+            )
+            rows = cursor.fetchall()
+    result = defaultdict(list)
+    for user_id, author_id in rows:
+        result[user_id].append(author_id)
+    return result
+
+
+def get_suggestion_scores(user_ids):
+    """Оценки авторов-кандидатов для пользователей.
+
+    Каждый путь пользователь -> подписка -> ее подписка добавляет к
+    оценке автора 1, каждый рецепт автора в избранном - FAVORITE_WEIGHT.
+    Для пользователей и их подписок учитываются только MAX_FOLLOWS и
+    MAX_FRIEND_FOLLOWS последних подписок, поэтому работа не растет
+    квадратично для популярных пользователей.
+    """
+    follows = get_follows(user_ids)
+    followed = {
+        user_id: set(author_ids) for user_id, author_ids in follows.items()
+    }
+    friends = {
+        user_id: author_ids[:MAX_FOLLOWS]
+        for user_id, author_ids in follows.items()
+    }
+    friend_follows = get_follows(
+        {friend_id for ids in friends.values() for friend_id in ids},
+        MAX_FRIEND_FOLLOWS
+    )
+    scores = defaultdict(Counter)
+    for user_id, friend_ids in friends.items():
+        for friend_id in friend_ids:
+            scores[user_id].update(friend_follows[friend_id])
+    for user_id, author_id, count in Favorite.objects.filter(
+        user__in=user_ids
+    ).order_by().values('user_id', 'recipe__author_id').annotate(
+        count=Count('id')
+    ).values_list('user_id', 'recipe__author_id', 'count'):
+        scores[user_id][author_id] += FAVORITE_WEIGHT * count
+    return {
+        user_id: sorted(
+            (
+                (score, author_id)
+                for author_id, score in scores[user_id].items()
+                if author_id != user_id
+                and author_id not in followed.get(user_id, ())
+            ),
+            reverse=True
+        )[:SUGGESTED_AUTHORS_LIMIT]
+        for user_id in user_ids
+    }
+
+
+def invalidate_suggestions_cache(*user_ids):
+    if user_ids:
+        cache.delete_many([
+            SUGGESTED_AUTHORS_CACHE_KEY.format(user_id)
+            for user_id in user_ids
+        ])
+
+
+def get_suggested_author_ids(user_id):
+    """Id рекомендуемых авторов в порядке убывания оценки (с кэшем)."""
+    key = SUGGESTED_AUTHORS_CACHE_KEY.format(user_id)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = list(SuggestedAuthor.objects.filter(
+            user_id=user_id
+        ).order_by('-score').values_list('author_id', flat=True))
+        cache.set(key, author_ids, settings.SUGGESTED_AUTHORS_CACHE_TIMEOUT)
+    return author_ids
+
+
+@transaction.atomic
+def update_suggested_authors(*user_ids):
+    """Пересчитывает рекомендуемых авторов для пользователей."""
+    scores = get_suggestion_scores(user_ids)
+    SuggestedAuthor.objects.filter(user__in=user_ids).delete()
+    SuggestedAuthor.objects.bulk_create(
+        SuggestedAuthor(user_id=user_id, author_id=author_id, score=score)
+        for user_id, user_scores in scores.items()
+        for score, author_id in user_scores
+    )
+    transaction.on_commit(lambda: invalidate_suggestions_cache(*user_ids))
+
+
+def remove_suggested_author(user_id, author_id):
+    """Убирает автора из рекомендаций сразу после подписки на него."""
+    SuggestedAuthor.objects.filter(
+        user_id=user_id,
+        author_id=author_id
+    ).delete()
+    invalidate_suggestions_cache(user_id)
+
+
+def build_suggested_authors(batch_size=500):
+    """Перестраивает таблицу рекомендуемых авторов пачками пользователей.
+
+    Каждая пачка пересчитывается в своей транзакции, поэтому
+    рекомендации остаются доступны во время перестройки.
+    """
+    after_id = 0
+    users_count = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=after_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            return users_count
+        update_suggested_authors(*user_ids)
+        users_count += len(user_ids)
+        after_id = user_ids[-1]
+
+
+def schedule_suggested_authors_refresh():
+    """Ставит перестройку в очередь не чаще раза в интервал обновления.
+
+    Интервал задается SUGGESTED_AUTHORS_REFRESH_INTERVAL в секундах;
+    время следующей постановки хранится в базе данных, общей для всех
+    обработчиков.
+    """
+    interval = settings.SUGGESTED_AUTHORS_REFRESH_INTERVAL
+    if interval:
+        enqueue_periodic(build_suggested_authors, interval)
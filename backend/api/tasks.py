@@ -0,0 +1,264 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from recipes.models import Task, TaskSchedule
+
+logger = logging.getLogger(__name__)
+
+
+def get_task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, countdown=0):
+    """Ставит вызов func(*args) в очередь фоновых задач.
+
+    Задача сохраняется в текущей транзакции и видна обработчикам только
+    после ее фиксации. При TASKS_EAGER вызов выполняется сразу после
+    фиксации транзакции в текущем процессе.
+    """
+    name = get_task_name(func)
+    if settings.TASKS_EAGER:
+        def run():
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('Ошибка в задаче %s', name)
+
+        transaction.on_commit(run)
+        return None
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        run_at=timezone.now() + timedelta(seconds=countdown)
+    )
+
+
+def enqueue_periodic(func, interval):
+    """Ставит func() в очередь не чаще раза в interval секунд.
+
+    Время следующей постановки хранится в строке TaskSchedule, которая
+    блокируется на время проверки, поэтому из нескольких обработчиков
+    задачу ставит только один.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        schedule, _ = TaskSchedule.objects.select_for_update().get_or_create(
+            name=get_task_name(func),
+            defaults={'next_run_at': now}
+        )
+        if schedule.next_run_at > now:
+            return False
+        schedule.next_run_at = now + timedelta(seconds=interval)
+        schedule.save(update_fields=('next_run_at',))
+        enqueue(func)
+    return True
+
+
+def claim_tasks(limit):
+    """Забирает до limit готовых задач, пропуская заблокированные другими.
+
+    Задачи, обработчик которых не уложился в TASK_VISIBILITY_TIMEOUT,
+    снова становятся доступны.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Task.PENDING, run_at__lte=now)
+                | Q(status=Task.RUNNING, locked_until__lte=now)
+            ).order_by('run_at')[:limit]
+        )
+        if not tasks:
+            return []
+        locked_until = now + timedelta(
+            seconds=settings.TASK_VISIBILITY_TIMEOUT
+        )
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=locked_until,
+            started_at=now
+        )
+    for task in tasks:
+        task.status = Task.RUNNING
+        task.attempts += 1
+        task.locked_until = locked_until
+        task.started_at = now
+    return tasks
+
+
+def extend_lease(task):
+    """Продлевает блокировку задачи на TASK_VISIBILITY_TIMEOUT.
+
+    Возвращает False, если блокировка истекла и задачу забрал другой
+    обработчик.
+    """
+    locked_until = timezone.now() + timedelta(
+        seconds=settings.TASK_VISIBILITY_TIMEOUT
+    )
+    if not Task.objects.filter(
+        pk=task.pk,
+        locked_until=task.locked_until
+    ).update(locked_until=locked_until):
+        return False
+    task.locked_until = locked_until
+    return True
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Продлевает блокировку задачи, пока она выполняется.
+
+    Блокировка продлевается каждую треть TASK_VISIBILITY_TIMEOUT, поэтому
+    долгие задачи не забираются повторно другими обработчиками.
+    """
+
+    def __init__(self, task):
+        super().__init__(daemon=True)
+        self.task = task
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(
+                settings.TASK_VISIBILITY_TIMEOUT / 3
+            ):
+                if not extend_lease(self.task):
+                    logger.warning(
+                        'Блокировка задачи %s (%s) потеряна',
+                        self.task.pk,
+                        self.task.name
+                    )
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def execute_task(task):
+    """Выполняет задачу и сохраняет результат.
+
+    После ошибки задача возвращается в очередь с экспоненциальной
+    задержкой, пока не исчерпаны попытки.
+    """
+    if task.attempts > task.max_attempts:
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.FAILED,
+            locked_until=None,
+            finished_at=timezone.now(),
+            last_error='Превышено время блокировки на последней попытке.'
+        )
+        return
+    # задачи пачки ждут своей очереди, и блокировка могла истечь
+    if not extend_lease(task):
+        logger.warning(
+            'Задача %s (%s) уже забрана другим обработчиком',
+            task.pk,
+            task.name
+        )
+        return
+    heartbeat = LeaseHeartbeat(task)
+    heartbeat.start()
+    try:
+        import_string(task.name)(*task.args)
+    except Exception:
+        logger.exception('Ошибка в задаче %s (%s)', task.pk, task.name)
+        now = timezone.now()
+        if task.attempts >= task.max_attempts:
+            changes = {'status': Task.FAILED, 'finished_at': now}
+        else:
+            changes = {
+                'status': Task.PENDING,
+                'run_at': now + timedelta(
+                    seconds=settings.TASK_RETRY_DELAY
+                    * 2 ** (task.attempts - 1)
+                ),
+            }
+        changes['last_error'] = traceback.format_exc()
+    else:
+        now = timezone.now()
+        changes = {'status': Task.DONE, 'finished_at': now}
+        logger.info(
+            'Задача %s (%s) выполнена за %.1f мс, ожидала %.1f мс',
+            task.pk,
+            task.name,
+            (now - task.started_at).total_seconds() * 1000,
+            (task.started_at - task.run_at).total_seconds() * 1000
+        )
+    finally:
+        heartbeat.stop()
+    if not Task.objects.filter(
+        pk=task.pk,
+        locked_until=task.locked_until
+    ).update(locked_until=None, **changes):
+        logger.warning(
+            'Результат задачи %s (%s) не сохранен: блокировка потеряна',
+            task.pk,
+            task.name
+        )
+
+
+def run_tasks(limit):
+    """Забирает и выполняет одну пачку задач; возвращает их количество."""
+    tasks = claim_tasks(limit)
+    for task in tasks:
+        execute_task(task)
+    return len(tasks)
+
+
+def delete_finished_tasks():
+    """Удаляет выполненные задачи старше TASK_RESULT_TTL секунд."""
+    return Task.objects.filter(
+        status=Task.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.TASK_RESULT_TTL
+        )
+    ).delete()[0]
+
+
+def get_queue_stats(window=3600):
+    """Глубина очереди и задержки выполнения задач за последние window с."""
+    now = timezone.now()
+    depth = dict(
+        Task.objects.order_by().values_list('status').annotate(
+            count=Count('id')
+        )
+    )
+    oldest_pending = Task.objects.filter(
+        status=Task.PENDING,
+        run_at__lte=now
+    ).aggregate(oldest=Min('run_at'))['oldest']
+    latencies = sorted(
+        (finished_at - run_at).total_seconds()
+        for run_at, finished_at in Task.objects.filter(
+            status=Task.DONE,
+            finished_at__gte=now - timedelta(seconds=window)
+        ).values_list('run_at', 'finished_at')
+    )
+    return {
+        'depth': {
+            status: depth.get(status, 0)
+            for status, _ in Task.STATUS_CHOICES
+        },
+        'oldest_pending_age': (
+            (now - oldest_pending).total_seconds()
+            if oldest_pending else 0
+        ),
+        'done': len(latencies),
+        'latency_p50': latencies[len(latencies) // 2] if latencies else 0,
+        'latency_p95': (
+            latencies[int(len(latencies) * 0.95)] if latencies else 0
+        ),
+        'latency_max': latencies[-1] if latencies else 0,
+    }
@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .timing import get_current_timer
+
+BUCKET_CACHE_KEY = 'throttle:bucket:{}:{}:{}'
+# расход хранится в тысячных долях токена: cache.incr работает с целыми
+TOKEN_SCALE = 1000
+
+
+class TokenBucket:
+    """Ограничение расхода токенов в общем кэше по скользящему окну.
+
+    За окно длиной capacity / refill_rate секунд можно потратить
+    capacity токенов, то есть в среднем refill_rate токенов в секунду.
+    Расход текущего окна меняется атомарно через cache.incr, расход
+    прошлого окна учитывается пропорционально его части в скользящем
+    окне, поэтому параллельные запросы не теряют списания друг друга.
+    """
+
+    def __init__(self, scope, ident, capacity, refill_rate):
+        self.scope = scope
+        self.ident = ident
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.window = capacity / refill_rate
+
+    def get_key(self, window_number):
+        return BUCKET_CACHE_KEY.format(self.scope, self.ident, window_number)
+
+    def consume(self, cost, now):
+        """Списывает cost токенов (при отрицательном - возвращает).
+
+        Возвращает расход за скользящее окно с учетом списания.
+        """
+        window_number, position = divmod(now, self.window)
+        window_number = int(window_number)
+        key = self.get_key(window_number)
+        delta = round(cost * TOKEN_SCALE)
+        timeout = int(self.window * 2) + 1
+        cache.add(key, 0, timeout)
+        try:
+            used = cache.incr(key, delta)
+        except ValueError:
+            # запись вытеснена из кэша между add и incr
+            used = max(delta, 0)
+            cache.set(key, used, timeout)
+        previous = cache.get(self.get_key(window_number - 1), 0)
+        return (
+            previous * (1 - position / self.window) + used
+        ) / TOKEN_SCALE
+
+
+class CostThrottle(BaseThrottle):
+    """Ограничение по стоимости запросов для пользователя и IP-адреса.
+
+    Стоимость действия задается в атрибуте throttle_costs представления
+    (по умолчанию 1); после ответа дополнительно списывается время
+    запросов к базе данных по THROTTLE_DB_TIME_COST токенов в секунду.
+    """
+
+    def get_buckets(self, request):
+        buckets = [TokenBucket(
+            'ip',
+            self.get_ident(request),
+            settings.THROTTLE_IP_CAPACITY,
+            settings.THROTTLE_IP_REFILL_RATE
+        )]
+        if request.user and request.user.is_authenticated:
+            buckets.append(TokenBucket(
+                'user',
+                request.user.pk,
+                settings.THROTTLE_USER_CAPACITY,
+                settings.THROTTLE_USER_REFILL_RATE
+            ))
+        return buckets
+
+    @staticmethod
+    def get_cost(view):
+        return getattr(view, 'throttle_costs', {}).get(
+            getattr(view, 'action', None),
+            1
+        )
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        now = time.time()
+        buckets = self.get_buckets(request)
+        cost = self.get_cost(view)
+        self.wait_time = 0
+        for bucket in buckets:
+            # запрос дороже емкости корзины проходит, если она пуста
+            overflow = (
+                bucket.consume(cost, now) - cost + min(cost, bucket.capacity)
+                - bucket.capacity
+            )
+            if overflow > 0:
+                self.wait_time = max(
+                    self.wait_time,
+                    overflow / bucket.refill_rate
+                )
+        if self.wait_time:
+            for bucket in buckets:
+                bucket.consume(-cost, now)
+            return False
+        timer = get_current_timer()
+        if timer is not None and settings.THROTTLE_DB_TIME_COST:
+            timer.add_finish_callback(
+                lambda timer: self.charge_db_time(buckets, timer.db_time)
+            )
+        return True
+
+    @staticmethod
+    def charge_db_time(buckets, db_time):
+        cost = db_time * settings.THROTTLE_DB_TIME_COST
+        if cost:
+            now = time.time()
+            for bucket in buckets:
+                bucket.consume(cost, now)
+
+    def wait(self):
+        return self.wait_time
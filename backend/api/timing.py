@@ -0,0 +1,144 @@
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Время этапов обработки запроса и время запросов к базе данных."""
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.render_started = None
+        self.finish_callbacks = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.finish_render)
+
+    def finish_render(self, response):
+        if self.render_started is not None:
+            self.phases['render'] += time.perf_counter() - self.render_started
+            self.render_started = None
+
+    def add_finish_callback(self, callback):
+        """Вызовет callback(timer) после обработки запроса."""
+        self.finish_callbacks.append(callback)
+
+    def finish(self):
+        for callback in self.finish_callbacks:
+            callback(self)
+
+    def as_dict(self):
+        return {
+            **{
+                f'{name}_ms': round(duration * 1000, 2)
+                for name, duration in self.phases.items()
+            },
+            'db_ms': round(self.db_time * 1000, 2),
+            'db_queries': self.db_queries,
+        }
+
+    def as_header(self):
+        metrics = [
+            f'{name};dur={duration * 1000:.2f}'
+            for name, duration in self.phases.items()
+        ]
+        metrics.append(
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="{self.db_queries} queries"'
+        )
+        return ', '.join(metrics)
+
+
+def get_current_timer():
+    return _current_timer.get()
+
+
+@contextmanager
+def use_timer(timer):
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время выполнения блока к этапу name текущего запроса."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+class TimedSerializerMixin:
+    """Учитывает построение serializer.data как этап serialize."""
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimingMixin:
+    """Замеряет этапы обработки запроса во ViewSet."""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with timed('permissions'):
+            super().check_permissions(request)
+
+    def check_throttles(self, request):
+        with timed('throttle'):
+            super().check_throttles(request)
+
+    def get_queryset(self):
+        with timed('queryset'):
+            return super().get_queryset()
+
+    def filter_queryset(self, queryset):
+        with timed('filter'):
+            return super().filter_queryset(queryset)
+
+    def paginate_queryset(self, queryset):
+        with timed('paginate'):
+            return super().paginate_queryset(queryset)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs
+        )
+        timer = get_current_timer()
+        if timer is not None and hasattr(response, 'add_post_render_callback'):
+            timer.start_render(response)
+        return response
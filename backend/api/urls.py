@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
+from .async_views import get_async_urls
 from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
                     UserSubscriptionViewSet)
 
@@ -12,5 +14,12 @@ router.register('users', UserSubscriptionViewSet)
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include(router.urls)),
+    path(
+        '',
+        include(
+            get_async_urls(router.urls)
+            if settings.ASYNC_READ_VIEWS
+            else router.urls
+        )
+    ),
 ]
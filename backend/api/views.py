@@ -1,30 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Exists, F, OuterRef
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCart, Tag, User)
+from recipes.models import (Favorite, Follow, Ingredient, IngredientChange,
+                            IngredientRecipe, Recipe, RecipeChange,
+                            ShoppingCart, Tag, User)
 
+from .cache import (get_ingredient_snapshot, get_ingredient_version,
+                    invalidate_count_cache)
+from .db_json import (get_recipe_json_rows, is_database_json_enabled,
+                      iter_json_array)
+from .export import (iter_ndjson, iter_recipe_records, iter_user_records,
+                     parse_user_cursor)
 from .filters import IngredientFilter, RecipeFilter
 from .pagination import PageNumberLimitPagination
+from .pantry import get_pantry_index
 from .permissions import AuthorOrReadOnly
-from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeGetSerializer,
-                          RecipeSerializer, ShoppingCartSerializer,
-                          TagSerializer, UserRecipesSerializer, UserSerializer)
-
-
-class UserSubscriptionViewSet(UserViewSet):
+from .purge import SurrogateKeyMixin
+from .renderers import FastJSONRenderer
+from .serializers import (CachedRecipeGetSerializer, IngredientSerializer,
+                          PantrySerializer, RecipeGetSerializer,
+                          RecipeSerializer, RecipeShortSerializer,
+                          TagSerializer, UserRecipesSerializer, UserSerializer,
+                          get_requested_fields)
+from .similarity import get_similar_recipe_ids
+from .suggestions import get_suggested_author_ids
+from .timing import TimingMixin, timed
+
+
+class UserSubscriptionViewSet(TimingMixin, UserViewSet):
     """ViewSet для пользователей."""
 
     serializer_class = UserSerializer
     pagination_class = PageNumberLimitPagination
-
+    throttle_costs = {
+        'create': 10,
+        'set_password': 10,
+        'subscriptions': 5,
+        'suggestions': 5,
+        'subscribe': 2,
+        'delete_subscribe': 2,
+    }
+
+    @timed('queryset')
     def get_queryset(self):
         return User.objects.annotate(recipes_count=Count('recipes'))
 
@@ -34,30 +63,59 @@ class UserSubscriptionViewSet(UserViewSet):
         return super().get_permissions()
 
     @staticmethod
-    def create_relation(serializer, request, id):
-        relation_dict = {
-            'user': request.user.id,
-            'author': id
-        }
-        relation_serializer = serializer(
-            data=relation_dict,
-            context={'request': request}
-        )
-        relation_serializer.is_valid(raise_exception=True)
-        relation_serializer.save()
+    def create_relation(relation_class, request, id):
+        try:
+            author = User.objects.annotate(
+                recipes_count=Count('recipes')
+            ).filter(id=id).first()
+        except ValueError:
+            author = None
+        if author is None:
+            return Response(
+                {'errors': f'Автора с id = {id} не существует.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if author == request.user:
+            return Response(
+                {'errors': 'Пользователь не может подписаться на себя!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                relation_class.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            # связь уже есть, если нарушена уникальность; иначе автора
+            # удалили после проверки и нарушен внешний ключ
+            if relation_class.objects.filter(
+                user=request.user,
+                author=author
+            ).exists():
+                return Response(
+                    {'errors': (f'Автор {author} уже есть '
+                                f'в таблице {relation_class.__name__}.')},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(
+                {'errors': f'Автора с id = {id} не существует.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        invalidate_count_cache(request.user.pk)
         return Response(
-            relation_serializer.data,
+            UserRecipesSerializer(author, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
 
     @staticmethod
     def delete_relation(relation_class, request, id):
-        relation = relation_class.objects.filter(
-            user=request.user,
-            author__id=id
-        )
-        if relation.exists():
-            relation.first().delete()
+        try:
+            deleted_count, _ = relation_class.objects.filter(
+                user=request.user,
+                author__id=id
+            ).delete()
+        except ValueError:
+            deleted_count = 0
+        if deleted_count:
+            invalidate_count_cache(request.user.pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': (f'Автора с id = {id} нет '
@@ -69,11 +127,7 @@ class UserSubscriptionViewSet(UserViewSet):
             methods=('post',),
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id=None):
-        return UserSubscriptionViewSet.create_relation(
-            FollowSerializer,
-            request,
-            id
-        )
+        return UserSubscriptionViewSet.create_relation(Follow, request, id)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
@@ -91,52 +145,286 @@ class UserSubscriptionViewSet(UserViewSet):
             context={'request': request}
         ).data)
 
+    @action(detail=False,
+            permission_classes=(IsAuthenticated,))
+    def suggestions(self, request):
+        page = self.paginate_queryset(
+            get_suggested_author_ids(request.user.pk)
+        )
+        authors = User.objects.annotate(
+            recipes_count=Count('recipes')
+        ).in_bulk(page)
+        return self.get_paginated_response(UserRecipesSerializer(
+            [authors[pk] for pk in page if pk in authors],
+            many=True,
+            context={'request': request}
+        ).data)
+
+    @action(detail=True, permission_classes=(IsAdminUser,))
+    def export(self, request, id=None):
+        user = self.get_object()
+        after = request.query_params.get('after')
+        try:
+            parse_user_cursor(after)
+        except ValueError as error:
+            return Response(
+                {'after': str(error)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return StreamingHttpResponse(
+            iter_ndjson(iter_user_records(user, after)),
+            content_type='application/x-ndjson'
+        )
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(TimingMixin, SurrogateKeyMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """ViewSet для ингредиентов."""
 
+    surrogate_key = 'ingredients'
+
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
-
-class RecipeViewSet(viewsets.ModelViewSet):
+    @staticmethod
+    def get_snapshot_response(request, version):
+        etag = f'"ingredients-{version}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            body, compressed_body = get_ingredient_snapshot(
+                version,
+                IngredientSerializer,
+                FastJSONRenderer
+            )
+            response = HttpResponse(body, content_type='application/json')
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                response.content = compressed_body
+                response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(response.content))
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @action(detail=False, filter_backends=())
+    def sync(self, request):
+        version = get_ingredient_version()
+        since = request.query_params.get('since')
+        if since is None:
+            return IngredientViewSet.get_snapshot_response(request, version)
+        try:
+            since = int(since)
+        except ValueError:
+            return Response(
+                {'since': 'Версия должна быть целым числом.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        changes = IngredientChange.objects.filter(
+            id__gt=since,
+            id__lte=version
+        )
+        changed_ids = set(changes.values_list('ingredient_id', flat=True))
+        changed = IngredientSerializer(
+            Ingredient.objects.filter(
+                id__in=changes.values('ingredient_id')
+            ),
+            many=True
+        ).data
+        return Response({
+            'version': version,
+            'changed': changed,
+            'deleted': sorted(
+                changed_ids - {ingredient['id'] for ingredient in changed}
+            ),
+        })
+
+
+class RecipeViewSet(TimingMixin, SurrogateKeyMixin, viewsets.ModelViewSet):
     """ViewSet для рецептов."""
 
+    surrogate_key = 'recipes'
+    throttle_costs = {
+        'create': 20,
+        'partial_update': 20,
+        'destroy': 5,
+        'download_shopping_cart': 20,
+        'pantry': 5,
+        'changes': 5,
+        'favorite': 2,
+        'delete_favorite': 2,
+        'shopping_cart': 2,
+        'delete_shopping_cart': 2,
+    }
+
     pagination_class = PageNumberLimitPagination
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ('delete', 'get', 'patch', 'post', 'head', 'options')
+    changes_limit = 100
+    changes_max_limit = 500
+
+    def get_base_queryset(self):
+        """Рецепты без отметок избранного и списка покупок."""
+        qset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve', 'similar', 'pantry', 'changes'):
+            qset = qset.only('id', 'author')
+        return qset
 
+    @timed('queryset')
     def get_queryset(self):
-        qset = Recipe.objects.select_related('author').prefetch_related(
-            'tags',
-            'ingredients'
+        return self.annotate_user_marks(self.get_base_queryset())
+
+    def annotate_user_marks(self, qset):
+        """Добавляет к рецептам отметки избранного и списка покупок."""
+        fields = get_requested_fields(
+            self.request,
+            RecipeGetSerializer.Meta.fields
         )
         if self.request.user.is_authenticated:
-            qset = qset.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(
-                        user__id=self.request.user.id,
-                        recipe__pk=OuterRef('pk')
+            if 'is_favorited' in fields:
+                qset = qset.annotate(
+                    is_favorited=Exists(
+                        Favorite.objects.filter(
+                            user__id=self.request.user.id,
+                            recipe__pk=OuterRef('pk')
+                        )
                     )
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user__id=self.request.user.id,
-                        recipe__pk=OuterRef('pk')
+                )
+            if 'is_in_shopping_cart' in fields:
+                qset = qset.annotate(
+                    is_in_shopping_cart=Exists(
+                        ShoppingCart.objects.filter(
+                            user__id=self.request.user.id,
+                            recipe__pk=OuterRef('pk')
+                        )
                     )
                 )
-            )
         return qset
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
-            return RecipeGetSerializer
+            return CachedRecipeGetSerializer
         return RecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        # количество считается без отметок пользователя, поэтому его кэш
+        # общий для всех пользователей; отметки добавляются к странице
+        queryset = self.filter_queryset(self.get_base_queryset())
+        page = self.paginator.get_page_queryset(queryset, request, self)
+        if not is_database_json_enabled():
+            serializer = self.get_serializer(
+                list(self.annotate_user_marks(
+                    queryset if page is None else page
+                )),
+                many=True
+            )
+            if page is None:
+                return Response(serializer.data)
+            return self.get_paginated_response(serializer.data)
+        rows = get_recipe_json_rows(
+            queryset if page is None else page,
+            request,
+            get_requested_fields(request, RecipeGetSerializer.Meta.fields)
+        )
+        if page is None:
+            prefix, suffix = b'[', b']'
+        else:
+            envelope = FastJSONRenderer().render({
+                'count': self.paginator.page.paginator.count,
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+            })
+            prefix, suffix = envelope[:-1] + b',"results":[', b']}'
+        return StreamingHttpResponse(
+            iter_json_array(prefix, rows, suffix),
+            content_type='application/json'
+        )
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        similar_ids = get_similar_recipe_ids(recipe.pk)
+        try:
+            limit = int(request.query_params.get('limit', len(similar_ids)))
+        except ValueError:
+            limit = len(similar_ids)
+        similar_ids = similar_ids[:max(limit, 0)]
+        similar_recipes = self.get_queryset().filter(pk__in=similar_ids)
+        position = {recipe_id: i for i, recipe_id in enumerate(similar_ids)}
+        return Response(CachedRecipeGetSerializer(
+            sorted(similar_recipes, key=lambda item: position[item.pk]),
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=False, filter_backends=())
+    def changes(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', self.changes_limit))
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры since и limit должны быть целыми.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), self.changes_max_limit)
+        changes = RecipeChange.objects.filter(id__gt=since)
+        # id изменений выдаются до фиксации транзакций, поэтому свежие
+        # изменения не отдаются, пока не зафиксированы все более ранние
+        first_recent_id = RecipeChange.objects.filter(
+            changed_at__gt=timezone.now() - timedelta(
+                seconds=settings.RECIPE_CHANGES_DELAY
+            )
+        ).order_by('id').values_list('id', flat=True).first()
+        if first_recent_id is not None:
+            changes = changes.filter(id__lt=first_recent_id)
+        page = list(
+            changes.order_by('id').values_list('id', 'recipe_id')[:limit + 1]
+        )
+        has_more = len(page) > limit
+        page = page[:limit]
+        recipe_ids = {recipe_id for _, recipe_id in page}
+        recipes = list(
+            self.get_queryset().filter(pk__in=recipe_ids).order_by('pk')
+        )
+        return Response({
+            'version': page[-1][0] if page else since,
+            'has_more': has_more,
+            'changed': CachedRecipeGetSerializer(
+                recipes,
+                many=True,
+                context=self.get_serializer_context()
+            ).data,
+            'deleted': sorted(recipe_ids - {recipe.pk for recipe in recipes}),
+        })
+
+    @action(detail=False,
+            methods=('post',),
+            permission_classes=(IsAuthenticated,))
+    def pantry(self, request):
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        matches = get_pantry_index().match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data.get('max_missing'),
+            serializer.validated_data.get('tags')
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk([match[0] for match in page])
+        page = [match for match in page if match[0] in recipes]
+        results = CachedRecipeGetSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for data, (_, coverage, missing) in zip(results, page):
+            data['coverage'] = round(coverage, 4)
+            data['missing_count'] = missing
+        return self.get_paginated_response(results)
+
     @staticmethod
     def create_ingredients_str(ingredients):
         shopping_cart = {}
@@ -165,28 +453,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
                             as_attachment=True,
                             content_type='text/plain')
 
+    @action(detail=False, permission_classes=(IsAdminUser,))
+    def export(self, request):
+        try:
+            after_id = int(request.query_params.get('after_id', 0))
+        except ValueError:
+            return Response(
+                {'after_id': 'Ожидается целое число.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return StreamingHttpResponse(
+            iter_ndjson(iter_recipe_records(after_id)),
+            content_type='application/x-ndjson'
+        )
+
     @staticmethod
-    def create_relation(serializer, request, pk):
-        relation_dict = {
-            'user': request.user.id,
-            'recipe': pk
-        }
-        relation_serializer = serializer(data=relation_dict)
-        relation_serializer.is_valid(raise_exception=True)
-        relation_serializer.save()
+    def create_relation(relation_class, request, pk):
+        try:
+            recipe = Recipe.objects.filter(pk=pk).first()
+        except ValueError:
+            recipe = None
+        if recipe is None:
+            return Response(
+                {'errors': f'Рецепта с id = {pk} не существует.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                relation_class.objects.create(user=request.user, recipe=recipe)
+        except IntegrityError:
+            # связь уже есть, если нарушена уникальность; иначе рецепт
+            # удалили после проверки и нарушен внешний ключ
+            if relation_class.objects.filter(
+                user=request.user,
+                recipe=recipe
+            ).exists():
+                return Response(
+                    {'errors': ('Связь между пользователем и рецептом '
+                                f'{recipe} уже существует.')},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(
+                {'errors': f'Рецепта с id = {pk} не существует.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        invalidate_count_cache(request.user.pk)
         return Response(
-            relation_serializer.data,
+            RecipeShortSerializer(recipe).data,
             status=status.HTTP_201_CREATED
         )
 
     @staticmethod
     def delete_relation(relation_class, request, pk):
-        relation = relation_class.objects.filter(
-            user=request.user,
-            recipe__id=pk
-        )
-        if relation.exists():
-            relation.first().delete()
+        try:
+            deleted_count, _ = relation_class.objects.filter(
+                user=request.user,
+                recipe__id=pk
+            ).delete()
+        except ValueError:
+            deleted_count = 0
+        if deleted_count:
+            invalidate_count_cache(request.user.pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': (f'Рецепта с id = {pk} нет '
@@ -198,7 +525,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             methods=('post',),
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk=None):
-        return RecipeViewSet.create_relation(FavoriteSerializer, request, pk)
+        return RecipeViewSet.create_relation(Favorite, request, pk)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
@@ -208,19 +535,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             methods=('post',),
             permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk=None):
-        return RecipeViewSet.create_relation(
-            ShoppingCartSerializer,
-            request,
-            pk
-        )
+        return RecipeViewSet.create_relation(ShoppingCart, request, pk)
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
         return RecipeViewSet.delete_relation(ShoppingCart, request, pk)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(TimingMixin, SurrogateKeyMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """ViewSet для тегов."""
 
+    surrogate_key = 'tags'
+
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.urls import get_resolver, resolve
+
+from recipes.models import Ingredient, Recipe
+
+from .cache import (get_cached_recipe_data, get_ingredient_snapshot,
+                    get_ingredient_version)
+from .filters import IngredientFilter, RecipeFilter
+from .orm_pool import get_executor
+from .pagination import PageNumberLimitPagination
+from .pantry import get_pantry_index
+from .renderers import FastJSONRenderer
+from .serializers import (CachedRecipeGetSerializer, IngredientSerializer,
+                          RecipeGetSerializer, RecipeSerializer,
+                          RecipeShortSerializer, TagSerializer,
+                          UserRecipesSerializer, UserSerializer)
+
+logger = logging.getLogger('api.warmup')
+
+WARM_UP_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/users/',
+    '/api/users/me/',
+)
+SERIALIZERS = (
+    CachedRecipeGetSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+    RecipeShortSerializer,
+    TagSerializer,
+    UserRecipesSerializer,
+    UserSerializer,
+)
+
+
+def warm_up_code():
+    """Выполняет то, что иначе откладывается до первого запроса.
+
+    Не обращается к базе данных, поэтому подходит для главного процесса
+    gunicorn с preload_app перед созданием рабочих процессов.
+    """
+    for path in WARM_UP_PATHS:
+        resolve(path)
+    # обращения к ленивым атрибутам заполняют их кэши
+    get_resolver().reverse_dict
+    for serializer_class in SERIALIZERS:
+        serializer_class().fields
+    for filterset_class, model in (
+        (RecipeFilter, Recipe),
+        (IngredientFilter, Ingredient),
+    ):
+        filterset_class(queryset=model.objects.none()).form
+    FastJSONRenderer().render({'warm_up': True})
+
+
+def warm_up_connections():
+    """Открывает соединения с базой данных рабочего процесса.
+
+    В режиме асинхронных чтений соединение открывается в каждом потоке
+    пула ORM.
+    """
+    connection.ensure_connection()
+    if not settings.ASYNC_READ_VIEWS:
+        return
+    barrier = threading.Barrier(settings.ORM_POOL_SIZE)
+
+    def connect():
+        barrier.wait(timeout=10)
+        connection.ensure_connection()
+
+    for future in [
+        get_executor().submit(connect)
+        for _ in range(settings.ORM_POOL_SIZE)
+    ]:
+        future.result()
+
+
+def warm_up_caches():
+    """Заполняет кэши снимка ингредиентов и первой страницы рецептов.
+
+    Там же строится индекс кладовой процесса, чтобы не строить его
+    в первом запросе.
+    """
+    get_pantry_index()
+    get_ingredient_snapshot(
+        get_ingredient_version(),
+        IngredientSerializer,
+        FastJSONRenderer
+    )
+    get_cached_recipe_data(
+        Recipe.objects.only('id')[:PageNumberLimitPagination.page_size],
+        RecipeGetSerializer
+    )
+
+
+def warm_up():
+    """Полный прогрев рабочего процесса перед приемом запросов."""
+    start = time.perf_counter()
+    warm_up_code()
+    code_time = time.perf_counter() - start
+    # БД может быть еще недоступна или не мигрирована: прогрев не должен
+    # мешать запуску процесса
+    for step in (warm_up_connections, warm_up_caches):
+        try:
+            step()
+        except Exception:
+            logger.exception('Прогрев: ошибка на шаге %s', step.__name__)
+            connection.close()
+    logger.info(
+        'Прогрев: код %.1f мс, всего %.1f мс',
+        code_time * 1000,
+        (time.perf_counter() - start) * 1000
+    )
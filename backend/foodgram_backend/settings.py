@@ -25,12 +25,19 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
     'djoser',
-    'api.apps.ApiConfig',
+    # обработчики сигналов recipes обновляют копии данных в рецептах
+    # раньше, чем обработчики api сбрасывают кэш
     'recipes.apps.RecipesConfig',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.RequestTimingMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.MemoryProfilingMiddleware',
+    'api.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,6 +85,57 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 3600))
+
+GATEWAY_PURGE_URL = os.getenv('GATEWAY_PURGE_URL', '')
+GATEWAY_PURGE_TIMEOUT = float(os.getenv('GATEWAY_PURGE_TIMEOUT', 1))
+
+# асинхронные представления чтения (включаются в foodgram_backend.asgi)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+# потоков ORM для асинхронных представлений (и соединений с БД) на процесс;
+# gunicorn.conf.py уменьшает его под DB_MAX_CONNECTIONS
+ORM_POOL_SIZE = int(os.getenv('ORM_POOL_SIZE', 8))
+
+# бюджет времени django.setup() и загрузки URL для команды startup_report
+STARTUP_TIME_BUDGET_MS = float(os.getenv('STARTUP_TIME_BUDGET_MS', 1500))
+
+SUGGESTED_AUTHORS_CACHE_TIMEOUT = int(
+    os.getenv('SUGGESTED_AUTHORS_CACHE_TIMEOUT', 3600)
+)
+# период полной перестройки рекомендуемых авторов, с (0 - выключена)
+SUGGESTED_AUTHORS_REFRESH_INTERVAL = int(
+    os.getenv('SUGGESTED_AUTHORS_REFRESH_INTERVAL', 86400)
+)
+
+# задержка в с, после которой изменение попадает в ленту изменений
+# рецептов: за это время фиксируются транзакции с меньшими id изменений
+RECIPE_CHANGES_DELAY = int(os.getenv('RECIPE_CHANGES_DELAY', 5))
+# то же для версии каталога ингредиентов в синхронизации, с
+INGREDIENT_CHANGES_DELAY = int(os.getenv('INGREDIENT_CHANGES_DELAY', 5))
+
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False') == 'True'
+TASK_WORKER_PROCESSES = int(os.getenv('TASK_WORKER_PROCESSES', 2))
+TASK_VISIBILITY_TIMEOUT = int(os.getenv('TASK_VISIBILITY_TIMEOUT', 300))
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', 10))
+TASK_RESULT_TTL = int(os.getenv('TASK_RESULT_TTL', 86400))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 300)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -124,8 +182,86 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_PAGINATION_CLASS': None,
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.CostThrottle',
+    ],
+
+    # число прокси перед приложением: адрес клиента для ограничения
+    # запросов берется из X-Forwarded-For, который добавляет шлюз nginx
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_USER_CAPACITY = float(os.getenv('THROTTLE_USER_CAPACITY', 300))
+THROTTLE_USER_REFILL_RATE = float(os.getenv('THROTTLE_USER_REFILL_RATE', 5))
+THROTTLE_IP_CAPACITY = float(os.getenv('THROTTLE_IP_CAPACITY', 600))
+THROTTLE_IP_REFILL_RATE = float(os.getenv('THROTTLE_IP_REFILL_RATE', 10))
+# сколько токенов стоит секунда запросов к базе данных
+THROTTLE_DB_TIME_COST = float(os.getenv('THROTTLE_DB_TIME_COST', 100))
+
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True') == 'True'
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'False') == 'True'
+REQUEST_TIMING_LOG_SAMPLE_RATE = float(
+    os.getenv('REQUEST_TIMING_LOG_SAMPLE_RATE', 0)
+)
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 500))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 3600))
+
+# доля запросов, память которых замеряется через tracemalloc
+MEMORY_PROFILING_SAMPLE_RATE = float(
+    os.getenv('MEMORY_PROFILING_SAMPLE_RATE', 0)
+)
+MEMORY_PROFILING_FRAMES = int(os.getenv('MEMORY_PROFILING_FRAMES', 5))
+MEMORY_PROFILING_TOP = int(os.getenv('MEMORY_PROFILING_TOP', 10))
+MEMORY_PROFILING_LOG_SIZE = int(os.getenv('MEMORY_PROFILING_LOG_SIZE', 500))
+
+SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG_ENABLED', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_EXPLAIN_ANALYZE = (
+    os.getenv('SLOW_QUERY_EXPLAIN_ANALYZE', 'False') == 'True'
+)
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 200))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }
 
+JSON_ENGINE = os.getenv('JSON_ENGINE', 'orjson')
+# serializer - сериализаторы DRF; database - JSON списка рецептов строит
+# PostgreSQL (на других СУБД используются сериализаторы)
+RECIPE_LIST_ENGINE = os.getenv('RECIPE_LIST_ENGINE', 'serializer')
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
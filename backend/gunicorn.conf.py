@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+
+# wsgi - синхронные процессы; asgi - uvicorn и асинхронные чтения
+server_mode = os.getenv('SERVER_MODE', 'wsgi')
+
+wsgi_app = f'foodgram_backend.{server_mode}:application'
+worker_class = (
+    'uvicorn.workers.UvicornWorker' if server_mode == 'asgi' else 'sync'
+)
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+# соединений с БД на все процессы gunicorn: max_connections PostgreSQL
+# за вычетом обработчика задач, миграций и администрирования
+db_max_connections = int(os.getenv('DB_MAX_CONNECTIONS', 90))
+# в режиме asgi у процесса соединение потока синхронного кода Django и по
+# соединению на поток пула ORM; пул уменьшается, чтобы уложиться в бюджет
+connections_per_worker = db_max_connections // workers
+if server_mode == 'asgi':
+    orm_pool_size = min(
+        int(os.getenv('ORM_POOL_SIZE', 8)),
+        connections_per_worker - 1
+    )
+    if orm_pool_size < 1:
+        raise RuntimeError(
+            f'DB_MAX_CONNECTIONS={db_max_connections} не хватает на '
+            f'{workers} процессов asgi: нужно хотя бы по 2 соединения.'
+        )
+    os.environ['ORM_POOL_SIZE'] = str(orm_pool_size)
+elif connections_per_worker < 1:
+    raise RuntimeError(
+        f'DB_MAX_CONNECTIONS={db_max_connections} меньше числа процессов '
+        f'gunicorn {workers}.'
+    )
+# приложение загружается один раз в главном процессе и наследуется
+# рабочими процессами
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# перезапуск процесса после max_requests запросов (0 - без перезапуска);
+# оценка по росту памяти - memory_profiles workers --rss-limit
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+warm_up = os.getenv('GUNICORN_WARM_UP', 'True') == 'True'
+
+
+def when_ready(server):
+    if preload_app and warm_up:
+        from api.warmup import warm_up_code
+        warm_up_code()
+
+
+def post_worker_init(worker):
+    if warm_up:
+        from api.warmup import warm_up as warm_up_worker
+        warm_up_worker()
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Ingredient, IngredientRecipe, Recipe, Tag, User
+from .models import (Ingredient, IngredientRecipe, Recipe, Tag, Task,
+                     TaskSchedule, User)
 
 
 class RequiredInline(admin.TabularInline):
@@ -36,6 +37,10 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     filter_horizontal = ('tags',)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.sync_ingredients_data()
+
     @admin.display(description='кол-во добавлений в избранное')
     def favorited_count(self, obj):
         return obj.favorite_set.count()
@@ -47,5 +52,17 @@ class RecipeAdmin(admin.ModelAdmin):
         )
 
 
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
+@admin.register(TaskSchedule)
+class TaskScheduleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'next_run_at')
+
+
 admin.site.register(Tag)
 admin.site.register(User, UserAdmin)
@@ -3,3 +3,4 @@ MAX_POSITIVE_SMALL_INTEGER = 32767
 MAX_EMAIL_LENGTH = 254
 MAX_FIELD_LENGTH_DEFAULT = 200
 MAX_USER_FIELD_LENGTH = 150
+TASK_MAX_ATTEMPTS = 5
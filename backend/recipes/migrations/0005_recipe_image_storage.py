@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:44
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_auto_20240406_2328'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+    ]
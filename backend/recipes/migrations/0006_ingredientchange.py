@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient_id', models.PositiveBigIntegerField(db_index=True, verbose_name='id ингредиента')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'изменение ингредиента',
+                'verbose_name_plural': 'изменения ингредиентов',
+                'ordering': ('id',),
+            },
+        ),
+    ]
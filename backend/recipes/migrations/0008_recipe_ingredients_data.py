@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+def fill_ingredients_data(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ingredients_data = {}
+    for recipe_id, ingredient_id, name, measurement_unit, amount in (
+        IngredientRecipe.objects.order_by('pk').values_list(
+            'recipe_id',
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        ).iterator()
+    ):
+        ingredients_data.setdefault(recipe_id, []).append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+    recipes = list(Recipe.objects.only('id'))
+    for recipe in recipes:
+        recipe.ingredients_data = ingredients_data.get(recipe.pk, [])
+    Recipe.objects.bulk_update(recipes, ('ingredients_data',), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_data',
+            field=models.JSONField(default=list, editable=False, verbose_name='Ингредиенты для чтения'),
+        ),
+        migrations.RunPython(fill_ingredients_data, migrations.RunPython.noop),
+    ]
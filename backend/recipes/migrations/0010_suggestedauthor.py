@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestedAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_authors', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'рекомендуемый автор',
+                'verbose_name_plural': 'рекомендуемые авторы',
+                'ordering': ('user', '-score'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='suggestedauthor',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_suggested_author'),
+        ),
+    ]
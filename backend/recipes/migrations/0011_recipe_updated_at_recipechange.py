@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-19 12:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('pub_date'))
+
+
+def log_existing_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeChange = apps.get_model('recipes', 'RecipeChange')
+    RecipeChange.objects.bulk_create(
+        (
+            RecipeChange(recipe_id=recipe_id, action='created')
+            for recipe_id in Recipe.objects.order_by(
+                'pub_date',
+                'pk'
+            ).values_list('pk', flat=True).iterator()
+        ),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_suggestedauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveBigIntegerField(db_index=True, verbose_name='id рецепта')),
+                ('action', models.CharField(choices=[('created', 'создан'), ('updated', 'изменен'), ('deleted', 'удален')], max_length=16, verbose_name='Действие')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'изменение рецепта',
+                'verbose_name_plural': 'изменения рецептов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunPython(log_existing_recipes, migrations.RunPython.noop),
+    ]
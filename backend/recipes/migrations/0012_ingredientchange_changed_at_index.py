@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_updated_at_recipechange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredientchange',
+            name='changed_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_ingredientchange_changed_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Функция')),
+                ('next_run_at', models.DateTimeField(verbose_name='Следующая постановка')),
+            ],
+            options={
+                'verbose_name': 'расписание задачи',
+                'verbose_name_plural': 'расписания задач',
+                'ordering': ('name',),
+            },
+        ),
+    ]
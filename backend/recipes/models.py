@@ -2,8 +2,10 @@ from colorfield.fields import ColorField
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from . import constants
+from .storage import ContentAddressedStorage
 
 
 class User(AbstractUser):
@@ -77,6 +79,26 @@ class Ingredient(models.Model):
         return self.name
 
 
+class IngredientChange(models.Model):
+    ingredient_id = models.PositiveBigIntegerField(
+        'id ингредиента',
+        db_index=True
+    )
+    changed_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'изменение ингредиента'
+        verbose_name_plural = 'изменения ингредиентов'
+
+    def __str__(self):
+        return f'изменение ингредиента {self.ingredient_id}'
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -101,6 +123,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение',
     )
     text = models.TextField('Текст')
@@ -112,6 +135,16 @@ class Recipe(models.Model):
         )
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+    ingredients_data = models.JSONField(
+        'Ингредиенты для чтения',
+        default=list,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
@@ -127,6 +160,65 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    def build_ingredients_data(self):
+        """Список ингредиентов рецепта в том виде, в каком он отдается API."""
+        return [
+            {
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            }
+            for ingredient_id, name, measurement_unit, amount in (
+                self.ingredient_in_recipe.order_by('pk').values_list(
+                    'ingredient_id',
+                    'ingredient__name',
+                    'ingredient__measurement_unit',
+                    'amount'
+                )
+            )
+        ]
+
+    def sync_ingredients_data(self, ingredients_data=None):
+        """Сохраняет копию списка ингредиентов в поле ingredients_data."""
+        if ingredients_data is None:
+            ingredients_data = self.build_ingredients_data()
+        self.ingredients_data = ingredients_data
+        Recipe.objects.filter(pk=self.pk).update(
+            ingredients_data=ingredients_data
+        )
+
+
+class RecipeChange(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'создан'),
+        (UPDATED, 'изменен'),
+        (DELETED, 'удален'),
+    )
+
+    recipe_id = models.PositiveBigIntegerField('id рецепта', db_index=True)
+    action = models.CharField(
+        'Действие',
+        max_length=16,
+        choices=ACTION_CHOICES
+    )
+    changed_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'изменение рецепта'
+        verbose_name_plural = 'изменения рецептов'
+
+    def __str__(self):
+        return f'{self.get_action_display()} рецепт {self.recipe_id}'
+
 
 class IngredientRecipe(models.Model):
     ingredient = models.ForeignKey(
@@ -164,6 +256,67 @@ class IngredientRecipe(models.Model):
                 f'в рецепте {self.recipe.name}')
 
 
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Степень сходства')
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.similar.name} похож на {self.recipe.name}'
+
+
+class SuggestedAuthor(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_authors',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_to',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('user', '-score')
+        verbose_name = 'рекомендуемый автор'
+        verbose_name_plural = 'рекомендуемые авторы'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_suggested_author'
+            ),
+        )
+
+    def __str__(self):
+        return (f'автор {self.author.username} рекомендован '
+                f'пользователю {self.user.username}')
+
+
 class UserRecipeBaseModel(models.Model):
     user = models.ForeignKey(
         User,
@@ -237,3 +390,74 @@ class Follow(models.Model):
     def __str__(self):
         return (f'подписка пользователя {self.user.username} '
                 f'на автора {self.author.username}')
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'завершилась ошибкой'),
+    )
+
+    name = models.CharField(
+        'Функция',
+        max_length=constants.MAX_FIELD_LENGTH_DEFAULT
+    )
+    args = models.JSONField('Аргументы', default=list)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=constants.TASK_MAX_ATTEMPTS
+    )
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Заблокирована до',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    started_at = models.DateTimeField('Начало', null=True, blank=True)
+    finished_at = models.DateTimeField('Окончание', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('run_at',)
+        verbose_name = 'фоновая задача'
+        verbose_name_plural = 'фоновые задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'),
+                name='task_status_run_at_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'задача {self.name} ({self.get_status_display()})'
+
+
+class TaskSchedule(models.Model):
+    name = models.CharField(
+        'Функция',
+        max_length=constants.MAX_FIELD_LENGTH_DEFAULT,
+        unique=True
+    )
+    next_run_at = models.DateTimeField('Следующая постановка')
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'расписание задачи'
+        verbose_name_plural = 'расписания задач'
+
+    def __str__(self):
+        return f'расписание {self.name}'
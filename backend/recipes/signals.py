@@ -0,0 +1,99 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (Ingredient, IngredientChange, Recipe, RecipeChange, Tag,
+                     User)
+
+INGREDIENTS_DATA_BATCH_SIZE = 500
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def log_ingredient_change(sender, instance, **kwargs):
+    IngredientChange.objects.create(ingredient_id=instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_save(sender, instance, created, **kwargs):
+    RecipeChange.objects.create(
+        recipe_id=instance.pk,
+        action=RecipeChange.CREATED if created else RecipeChange.UPDATED
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_delete(sender, instance, **kwargs):
+    RecipeChange.objects.create(
+        recipe_id=instance.pk,
+        action=RecipeChange.DELETED
+    )
+
+
+def touch_recipes(recipe_ids):
+    """Отмечает изменение рецептов, которые меняются без их сохранения.
+
+    Нужно, когда меняются данные, входящие в ответ API о рецепте:
+    ингредиенты, теги или автор.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    RecipeChange.objects.bulk_create(
+        (
+            RecipeChange(recipe_id=recipe_id, action=RecipeChange.UPDATED)
+            for recipe_id in recipe_ids
+        ),
+        batch_size=INGREDIENTS_DATA_BATCH_SIZE
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    touch_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+def update_ingredients_data(ingredient, update_item):
+    recipes = list(
+        Recipe.objects.filter(ingredients=ingredient).only('ingredients_data')
+    )
+    for recipe in recipes:
+        recipe.ingredients_data = [
+            update_item(item) if item['id'] == ingredient.pk else item
+            for item in recipe.ingredients_data
+        ]
+        recipe.ingredients_data = [
+            item for item in recipe.ingredients_data if item is not None
+        ]
+    Recipe.objects.bulk_update(
+        recipes,
+        ('ingredients_data',),
+        batch_size=INGREDIENTS_DATA_BATCH_SIZE
+    )
+    touch_recipes(recipe.pk for recipe in recipes)
+
+
+@receiver(post_save, sender=Ingredient)
+def rename_ingredient_in_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_ingredients_data(instance, lambda item: {
+            **item,
+            'name': instance.name,
+            'measurement_unit': instance.measurement_unit,
+        })
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remove_ingredient_from_recipes(sender, instance, **kwargs):
+    update_ingredients_data(instance, lambda item: None)
@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по sha256 их содержимого.
+
+    Повторно загруженный файл с тем же содержимым не записывается заново,
+    а получает имя уже сохраненного файла; время изменения этого файла
+    обновляется.
+    """
+
+    @staticmethod
+    def get_content_hash(content):
+        content_hash = hashlib.sha256()
+        if content.seekable():
+            content.seek(0)
+        for chunk in content.chunks():
+            content_hash.update(chunk)
+        if content.seekable():
+            content.seek(0)
+        return content_hash.hexdigest()
+
+    def get_content_name(self, name, content):
+        dir_name, file_name = os.path.split(name)
+        file_ext = os.path.splitext(file_name)[1].lower()
+        return os.path.join(
+            dir_name,
+            f'{self.get_content_hash(content)}{file_ext}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        try:
+            # время изменения защищает файл от удаления командой
+            # delete_orphan_images, пока рецепт с ним не сохранен
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name